@@ -0,0 +1,128 @@
+"""
+Async counterparts of the models queries that fan out to more than one Mongo call.
+
+All async work runs on one event loop per worker process, started lazily in a daemon
+thread, with a single AsyncMongoClient bound to it. Request threads hand coroutines to
+that loop with run(), so the queries inside one request run concurrently and every
+request in the process shares one async connection pool. Used when Config.SERVING_MODE
+is "async"; the sync models functions remain the default.
+
+That pool comes on top of the sync client's, which the rest of the models still use,
+so in async mode each worker can open up to twice MONGO_MAX_POOL_SIZE connections.
+What it buys is concurrency between the queries of one request, not more requests.
+"""
+import asyncio
+import os
+import threading
+
+import certifi
+from pymongo import AsyncMongoClient
+
+import models
+
+_loop = None
+_client = None
+_pid = None
+_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    # The parent's loop thread doesn't exist in the child, and its lock may have been held
+    global _loop, _client, _pid, _lock
+    _loop = None
+    _client = None
+    _pid = None
+    _lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _start():
+    global _loop, _client, _pid
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="async-mongo", daemon=True).start()
+
+    settings = models.config
+
+    async def connect():
+        options = {
+            "maxPoolSize": settings["MONGO_MAX_POOL_SIZE"],
+            "minPoolSize": settings["MONGO_MIN_POOL_SIZE"],
+            "waitQueueTimeoutMS": settings["MONGO_WAIT_QUEUE_TIMEOUT_MS"],
+        }
+        if "mongodb+srv" in settings["MONGO_URI"]:
+            options["tlsCAFile"] = certifi.where()
+        if settings["METRICS_ENABLED"]:
+            import metrics
+            options["event_listeners"] = metrics.mongo_listeners()
+        return AsyncMongoClient(settings["MONGO_URI"], **options)
+
+    _client = asyncio.run_coroutine_threadsafe(connect(), loop).result()
+    _loop = loop
+    _pid = os.getpid()
+
+
+def get_db():
+    """The async database handle for this process, created on first use (and again after a fork)."""
+    if _pid != os.getpid():
+        with _lock:
+            if _pid != os.getpid():
+                _start()
+    return _client[models.database_name()]
+
+
+def read_collection(name, route):
+    """Async counterpart of models.read_collection."""
+    return get_db()[name].with_options(**models.read_options(route))
+
+
+def run(coro, timeout=30):
+    """Run a coroutine on the process's event loop and wait for its result."""
+    get_db()
+    return asyncio.run_coroutine_threadsafe(coro, _loop).result(timeout)
+
+
+async def fetch_all_articles_paginated(genre=None, source=None, page=1, limit=20, cursor=None, fields=None,
+                                       with_total=False):
+    """
+    Async models.fetch_all_articles_paginated. With with_total the page query and the
+    count run concurrently. Returns (articles, next_cursor, total).
+    """
+    query, projection, skip = models.build_paginated_find(genre, source, page, limit, cursor, fields)
+
+    articles_coll = read_collection("articles", "feed")
+    page_query = articles_coll.find(query, projection).sort(models.FEED_SORT).skip(skip).limit(limit).to_list()
+    if with_total:
+        documents, total = await asyncio.gather(page_query, count_feed_articles(genre, source))
+    else:
+        documents, total = await page_query, None
+
+    articles, next_cursor = models.format_feed_page(documents, limit)
+    return articles, next_cursor, total
+
+
+async def count_feed_articles(genre=None, source=None):
+    """Async models.count_feed_articles."""
+    facets = await read_collection("article_facets", "stats").find_one({"_id": models.ARTICLE_FACETS_ID})
+    if not models.facets_are_fresh(facets):
+        # The primary check and background refresh are sync; keep them off the event loop
+        facets = await asyncio.to_thread(models.current_article_facets)
+    if facets:
+        return models.facet_total(facets, genre, source)
+    return await read_collection("articles", "feed").count_documents(models.build_count_query(genre, source))
+
+
+async def fetch_comments_by_id(article_id, limit=None, order="newest", cursor=None, with_total=False):
+    """Async models.fetch_comments_by_id. With with_total the page and the count run concurrently."""
+    comments = read_collection("comments", "comments")
+    query, sort, limit = models.build_comments_find(article_id, limit, order, cursor)
+
+    page_query = comments.find(query).sort(sort).limit(limit).to_list()
+    if with_total:
+        documents, total = await asyncio.gather(page_query, comments.count_documents({"article_id": article_id}))
+    else:
+        documents, total = await page_query, None
+
+    comments, next_cursor = models.format_comments_page(documents, order, limit)
+    return comments, next_cursor, total
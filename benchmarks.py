@@ -0,0 +1,380 @@
+"""
+Micro-benchmarks for every models function and API route against a seeded local mongod.
+
+Usage
+python benchmarks.py --uri mongodb://localhost:27017/esrs_bench --articles 20000 --iterations 200
+python benchmarks.py --no-seed --only comments --output bench_results.json
+python benchmarks.py --compare previous_results.json
+
+Each case reports p50/p95/p99 latency, throughput, Mongo commands per call and Python
+allocations, and the run is written as JSON. A jump in commands per call is the
+signature of a new N+1 loop. --compare exits non-zero when a case's p95 or command
+count regresses past --threshold.
+
+The target database is dropped and reseeded unless --no-seed is given, so its name
+must contain "bench".
+"""
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+import pymongo
+from pymongo import monitoring
+
+GENRES = ["World", "Business", "Technology", "Science", "Health", "Sport", "Politics", "Culture"]
+SOURCES = ["BBC-News", "Reuters", "Al-Jazeera", "The-Guardian", "AP", "NPR", "DW", "France24"]
+WORDS = ("election market climate vaccine league budget court storm energy summit protest "
+         "research startup inflation treaty satellite festival merger drought ceasefire").split()
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts commands sent to Mongo so each case can report round trips per call."""
+
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+command_counter = CommandCounter()
+
+
+def sentence(rng, length):
+    return " ".join(rng.choice(WORDS) for _ in range(length)).capitalize()
+
+
+def seed(db, articles, comments_per_article, ratings_per_article, users, collections_per_user, rng):
+    """Drop the benchmark database and fill it with a synthetic corpus."""
+    import indexes
+    import migrations
+    import models
+
+    db.client.drop_database(db.name)
+    now = datetime.datetime.now(datetime.timezone.utc)
+
+    article_docs = []
+    for i in range(articles):
+        article_docs.append({
+            "title": sentence(rng, 8),
+            "summary": sentence(rng, 40),
+            "body": sentence(rng, 600),
+            "source": rng.choice(SOURCES).replace("-", " "),
+            "author": rng.choice(SOURCES),
+            "genre": rng.choice(GENRES),
+            "published": now - datetime.timedelta(minutes=i),
+            "o_language": "en" if rng.random() < 0.8 else "fr",
+            "translated": rng.random() < 0.5,
+        })
+    for start in range(0, len(article_docs), 1000):
+        db.articles.insert_many(article_docs[start:start + 1000])
+    article_ids = [str(doc["_id"]) for doc in article_docs]
+    user_ids = [f"bench-user-{i}" for i in range(users)]
+
+    def insert_in_chunks(collection, documents):
+        for start in range(0, len(documents), 1000):
+            collection.insert_many(documents[start:start + 1000])
+
+    insert_in_chunks(db.comments, [
+        {"article_id": article_id, "user_id": rng.choice(user_ids), "comment": sentence(rng, 20),
+         "timestamp": now - datetime.timedelta(seconds=rng.randrange(86400 * 30))}
+        for article_id in article_ids for _ in range(comments_per_article)
+    ])
+    insert_in_chunks(db.ratings, [
+        {"article_id": article_id, "user_id": rng.choice(user_ids), "accuracy": rng.randrange(101),
+         "bias": rng.randrange(101), "insight": rng.randrange(101),
+         "timestamp": now - datetime.timedelta(seconds=rng.randrange(86400 * 30))}
+        for article_id in article_ids for _ in range(ratings_per_article)
+    ])
+    db.users.insert_many([
+        {"google_id": user_id, "name": f"Bench User {i}", "email": f"{user_id}@example.com"}
+        for i, user_id in enumerate(user_ids)
+    ])
+    db.article_collections.insert_many([
+        {"user_id": user_id, "collections": {
+            f"Collection {c}": rng.sample(article_ids, min(50, len(article_ids))) for c in range(collections_per_user)
+        }}
+        for user_id in user_ids
+    ])
+
+    indexes.ensure_indexes()
+    migrations.migrate_collections()
+    migrations.rebuild_rating_summaries()
+    migrations.rebuild_comment_counts()
+    models.refresh_article_facets()
+    return article_ids, user_ids
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    rank = max(int(round(fraction * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def measure(name, kind, call, iterations, warmup):
+    for _ in range(warmup):
+        call()
+
+    timings = []
+    commands_before = command_counter.count
+    started = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+    commands = command_counter.count - commands_before
+
+    # Allocations are sampled in a separate pass: tracing slows every allocation down
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+    snapshot_before = tracemalloc.take_snapshot()
+    call()
+    _, peak = tracemalloc.get_traced_memory()
+    allocated = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(snapshot_before, "filename")
+                    if stat.size_diff > 0)
+    tracemalloc.stop()
+
+    timings.sort()
+    return {
+        "name": name,
+        "kind": kind,
+        "iterations": iterations,
+        "p50_ms": percentile(timings, 0.50) * 1000,
+        "p95_ms": percentile(timings, 0.95) * 1000,
+        "p99_ms": percentile(timings, 0.99) * 1000,
+        "mean_ms": statistics.fmean(timings) * 1000,
+        "throughput_per_s": iterations / elapsed if elapsed else None,
+        "commands_per_call": commands / iterations,
+        "alloc_peak_bytes": peak - before,
+        "alloc_retained_bytes": allocated,
+    }
+
+
+def model_cases(article_ids, user_ids, rng):
+    import models
+
+    counter = itertools.count()
+    pick_article = lambda: rng.choice(article_ids)  # noqa: E731
+    pick_user = lambda: rng.choice(user_ids)  # noqa: E731
+    deep_cursor = models.fetch_all_articles_paginated(page=1, limit=len(article_ids) // 2)[1]
+    bench_user = "bench-writer"
+    models.create_collection(bench_user, "Reading")
+
+    def consume(generator):
+        for _ in generator:
+            pass
+
+    def rename_back_and_forth():
+        models.rename_collection(bench_user, "Reading", "Reading (renamed)")
+        models.rename_collection(bench_user, "Reading (renamed)", "Reading")
+
+    def create_and_delete_collection():
+        name = f"Temp {next(counter)}"
+        models.create_collection(bench_user, name)
+        models.delete_collection(bench_user, name)
+
+    def save_and_delete_comment():
+        comment = models.save_comment(pick_article(), bench_user, "Benchmark comment")
+        models.delete_comment_by_id(comment["_id"])
+
+    return [
+        ("fetch_all_articles", lambda: models.fetch_all_articles()),
+        ("fetch_all_articles genre", lambda: models.fetch_all_articles(genre=rng.choice(GENRES))),
+        ("fetch_all_articles card", lambda: models.fetch_all_articles(fields="card")),
+        ("iter_all_articles", lambda: consume(models.iter_all_articles())),
+        ("fetch_article_by_id", lambda: models.fetch_article_by_id(pick_article())),
+        ("fetch_articles_by_ids 50", lambda: models.fetch_articles_by_ids(rng.sample(article_ids, 50))),
+        ("search_articles", lambda: models.search_articles(rng.choice(WORDS))),
+        ("fetch_all_articles_paginated page 1", lambda: models.fetch_all_articles_paginated(page=1)),
+        ("fetch_all_articles_paginated deep page",
+         lambda: models.fetch_all_articles_paginated(page=len(article_ids) // 40)),
+        ("fetch_all_articles_paginated deep cursor", lambda: models.fetch_all_articles_paginated(cursor=deep_cursor)),
+        ("count_feed_articles", lambda: models.count_feed_articles(genre=rng.choice(GENRES))),
+        ("compute_article_facets", lambda: models.compute_article_facets()),
+        ("fetch_article_facets", lambda: models.fetch_article_facets()),
+        ("fetch_comments_by_id", lambda: models.fetch_comments_by_id(pick_article(), with_total=True)),
+        ("fetch_comments_by_user_id", lambda: models.fetch_comments_by_user_id(pick_user(), 50)),
+        ("fetch_ratings_by_article_id", lambda: models.fetch_ratings_by_article_id(pick_article())),
+        ("fetch_ratings_by_user_id", lambda: models.fetch_ratings_by_user_id(pick_user(), 50)),
+        ("fetch_rating_summary", lambda: models.fetch_rating_summary(pick_article())),
+        ("fetch_rating_summaries 100", lambda: models.fetch_rating_summaries(rng.sample(article_ids, 100))),
+        ("fetch_article_stats 100", lambda: models.fetch_article_stats(rng.sample(article_ids, 100))),
+        ("fetch_details_by_user_id", lambda: models.fetch_details_by_user_id(pick_user())),
+        ("fetch_user_collections", lambda: models.fetch_user_collections(pick_user())),
+        ("fetch_collections_with_articles", lambda: models.fetch_collections_with_articles(pick_user())),
+        ("fetch_collection_items", lambda: models.fetch_collection_items(pick_user(), "Collection 0")),
+        ("post_user_by_info", lambda: models.post_user_by_info(pick_user(), "bench@example.com", "Bench", None)),
+        ("save_comment + delete_comment_by_id", save_and_delete_comment),
+        ("save_rating", lambda: models.save_rating(pick_article(), bench_user, 50, 50, 50)),
+        ("save_comments_batch 50", lambda: models.save_comments_batch([
+            {"article_id": pick_article(), "user_id": bench_user, "comment": "Batch"} for _ in range(50)])),
+        ("save_ratings_batch 50", lambda: models.save_ratings_batch([
+            {"article_id": pick_article(), "user_id": bench_user, "accuracy": 1, "bias": 2, "insight": 3}
+            for _ in range(50)])),
+        ("create_collection + delete_collection", create_and_delete_collection),
+        ("add/remove_article_to_collection", lambda: (
+            models.add_article_to_collection(bench_user, "Reading", article_ids[0]),
+            models.remove_article_from_collection(bench_user, "Reading", article_ids[0]))),
+        ("rename_collection x2", rename_back_and_forth),
+    ]
+
+
+def route_cases(client, article_ids, user_ids, rng):
+    pick_article = lambda: rng.choice(article_ids)  # noqa: E731
+    pick_user = lambda: rng.choice(user_ids)  # noqa: E731
+
+    def get(url_factory):
+        def call():
+            response = client.get(url_factory())
+            response.get_data()
+            assert response.status_code < 500, response.status_code
+        return call
+
+    return [
+        ("GET /api/articles", get(lambda: "/api/articles")),
+        ("GET /api/articles?stream=1", get(lambda: "/api/articles?stream=1")),
+        ("GET /api/articles/<id>", get(lambda: f"/api/articles/{pick_article()}")),
+        ("GET /api/articles/batch", get(lambda: "/api/articles/batch?ids=" + ",".join(rng.sample(article_ids, 50)))),
+        ("GET /api/articles/facets", get(lambda: "/api/articles/facets")),
+        ("GET /api/articles/search", get(lambda: f"/api/articles/search?q={rng.choice(WORDS)}")),
+        ("GET /api/articles/paginated", get(lambda: "/api/articles/paginated?page=1&limit=20")),
+        ("GET /api/articles/paginated cursor", get(lambda: "/api/articles/paginated?limit=20&cursor=")),
+        ("GET /api/comments/<article_id>", get(lambda: f"/api/comments/{pick_article()}?total=1")),
+        ("GET /api/ratings/<article_id>", get(lambda: f"/api/ratings/{pick_article()}")),
+        ("GET /api/ratings/<article_id>/summary", get(lambda: f"/api/ratings/{pick_article()}/summary")),
+        ("GET /api/ratings/summary", get(lambda: "/api/ratings/summary?ids=" + ",".join(rng.sample(article_ids, 50)))),
+        ("GET /api/articles/stats", get(lambda: "/api/articles/stats?ids=" + ",".join(rng.sample(article_ids, 100)))),
+        ("GET /api/user/<user_id>", get(lambda: f"/api/user/{pick_user()}")),
+        ("GET /api/user/<user_id>/comments", get(lambda: f"/api/user/{pick_user()}/comments")),
+        ("GET /api/user/<user_id>/ratings", get(lambda: f"/api/user/{pick_user()}/ratings?limit=50")),
+        ("GET /api/collections/<user_id>", get(lambda: f"/api/collections/{pick_user()}")),
+        ("GET /api/collections/<user_id>/items",
+         get(lambda: f"/api/collections/{pick_user()}/items?collection=Collection%200")),
+        ("GET /api/collections/<user_id>/with-articles", get(lambda: f"/api/collections/{pick_user()}/with-articles")),
+    ]
+
+
+def compare(results, baseline_path, threshold):
+    """Names of cases whose p95 or commands per call grew by more than threshold x over the baseline."""
+    with open(baseline_path) as f:
+        baseline = {(r["kind"], r["name"]): r for r in json.load(f)["results"]}
+
+    regressions = []
+    for result in results:
+        previous = baseline.get((result["kind"], result["name"]))
+        if not previous:
+            continue
+        if result["p95_ms"] > previous["p95_ms"] * threshold:
+            regressions.append(f"{result['name']}: p95 {previous['p95_ms']:.2f}ms -> {result['p95_ms']:.2f}ms")
+        if result["commands_per_call"] > previous["commands_per_call"] * threshold + 0.5:
+            regressions.append(f"{result['name']}: commands/call {previous['commands_per_call']:.1f} -> "
+                               f"{result['commands_per_call']:.1f}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark models functions and API routes.")
+    parser.add_argument("--uri", default=os.environ.get("MONGO_BENCH_PATH", "mongodb://localhost:27017/esrs_bench"))
+    parser.add_argument("--articles", type=int, default=5000)
+    parser.add_argument("--comments-per-article", type=int, default=5)
+    parser.add_argument("--ratings-per-article", type=int, default=5)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--collections-per-user", type=int, default=5)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1234, help="random seed for the corpus and the queries")
+    parser.add_argument("--no-seed", action="store_true", help="reuse the corpus already in the database")
+    parser.add_argument("--cache", action="store_true", help="keep the article response cache enabled")
+    parser.add_argument("--only", help="run only cases whose name contains this text")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="results file from an earlier run to check for regressions")
+    parser.add_argument("--threshold", type=float, default=1.25)
+    args = parser.parse_args(argv)
+
+    import controllers
+    import models
+    from config import get_config
+
+    # Must be registered before the client is created
+    monitoring.register(command_counter)
+
+    class BenchConfig(get_config()):
+        MONGO_URI = args.uri
+        ARTICLE_CACHE_TTL = 60 if args.cache else 0
+        CHECK_INDEXES_ON_STARTUP = False
+
+    app = controllers.create_app(BenchConfig)
+    db = models.get_db()
+    if "bench" not in db.name:
+        parser.error(f"refusing to use database {db.name!r}: its name must contain 'bench'")
+
+    rng = random.Random(args.seed)
+    if args.no_seed:
+        article_ids = [str(doc["_id"]) for doc in db.articles.find({}, {"_id": 1})]
+        user_ids = [doc["google_id"] for doc in db.users.find({}, {"google_id": 1})]
+    else:
+        print(f"Seeding {args.articles} articles into {db.name}...")
+        article_ids, user_ids = seed(db, args.articles, args.comments_per_article, args.ratings_per_article,
+                                     args.users, args.collections_per_user, rng)
+
+    cases = [("model", name, call) for name, call in model_cases(article_ids, user_ids, rng)]
+    cases += [("route", name, call) for name, call in route_cases(app.test_client(), article_ids, user_ids, rng)]
+    if args.only:
+        cases = [case for case in cases if args.only in case[1]]
+
+    results = []
+    for kind, name, call in cases:
+        result = measure(name, kind, call, args.iterations, args.warmup)
+        results.append(result)
+        print(f"{kind:5} {name:48} p50 {result['p50_ms']:8.2f}ms  p95 {result['p95_ms']:8.2f}ms  "
+              f"p99 {result['p99_ms']:8.2f}ms  {result['throughput_per_s']:8.1f}/s  "
+              f"{result['commands_per_call']:5.1f} cmd/call")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "pymongo": pymongo.version,
+            "server": db.client.server_info().get("version"),
+            "corpus": {
+                "articles": len(article_ids),
+                "users": len(user_ids),
+                "comments": db.comments.estimated_document_count(),
+                "ratings": db.ratings.estimated_document_count(),
+            },
+            "iterations": args.iterations,
+            "cache": args.cache,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
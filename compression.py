@@ -0,0 +1,96 @@
+"""
+gzip/brotli compression for JSON responses, negotiated from Accept-Encoding.
+
+Responses smaller than COMPRESSION_MIN_SIZE go out as they are. Cached article
+responses are stored as CachedBody entries holding the compressed variants next to
+the plain body, so a hot feed is compressed once per cache fill rather than on
+every request. Brotli is used when the brotli package is installed.
+"""
+import gzip
+import time
+
+from flask import Response, current_app, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Server preference when the client accepts several encodings equally
+ENCODINGS = ("br", "gzip") if brotli else ("gzip",)
+COMPRESSIBLE_MIMETYPES = {"application/json"}
+
+
+def negotiate():
+    """The encoding to use for the current request, or None for identity."""
+    if not current_app.config["COMPRESSION_ENABLED"]:
+        return None
+    return request.accept_encodings.best_match(ENCODINGS)
+
+
+def compress(body, encoding, source="live"):
+    """Compress body with encoding, recording the CPU time and ratio in the metrics."""
+    settings = current_app.config
+    started = time.perf_counter()
+    if encoding == "br":
+        compressed = brotli.compress(body, quality=settings["COMPRESSION_BROTLI_QUALITY"])
+    else:
+        compressed = gzip.compress(body, compresslevel=settings["COMPRESSION_GZIP_LEVEL"])
+
+    if settings["METRICS_ENABLED"]:
+        import metrics
+        metrics.observe_compression(encoding, source, time.perf_counter() - started, len(compressed) / len(body))
+    return compressed
+
+
+class CachedBody:
+    """A cached JSON body and its compressed variants, built together when the entry is filled."""
+
+    __slots__ = ("body", "variants")
+
+    def __init__(self, body):
+        self.body = body
+        self.variants = {}
+        settings = current_app.config
+        if settings["COMPRESSION_ENABLED"] and len(body) >= settings["COMPRESSION_MIN_SIZE"]:
+            self.variants = {encoding: compress(body, encoding, source="cache") for encoding in ENCODINGS}
+
+    @property
+    def size(self):
+        return len(self.body) + sum(len(variant) for variant in self.variants.values())
+
+    def response(self, mimetype):
+        """A response carrying the variant the client accepts, or the plain body."""
+        encoding = negotiate() if self.variants else None
+        response = Response(self.variants[encoding] if encoding else self.body, mimetype=mimetype)
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        if current_app.config["COMPRESSION_ENABLED"]:
+            response.vary.add("Accept-Encoding")
+        return response
+
+
+def compress_response(response):
+    """after_request hook compressing JSON bodies that aren't compressed yet."""
+    if not current_app.config["COMPRESSION_ENABLED"]:
+        return response
+    if response.direct_passthrough or response.is_streamed or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+
+    response.vary.add("Accept-Encoding")
+    if "Content-Encoding" in response.headers or not 200 <= response.status_code < 300 or response.status_code == 204:
+        return response
+
+    body = response.get_data()
+    if len(body) < current_app.config["COMPRESSION_MIN_SIZE"]:
+        return response
+
+    encoding = negotiate()
+    if encoding:
+        response.set_data(compress(body, encoding))
+        response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def init_app(app):
+    app.after_request(compress_response)
@@ -5,9 +5,104 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
+def read_route(name, preference, concern="local", max_staleness=-1):
+    """
+    Read settings for one group of queries, each overridable from the environment as
+    <NAME>_READ_PREFERENCE, <NAME>_READ_CONCERN and <NAME>_MAX_STALENESS_SECONDS.
+    """
+    prefix = name.upper()
+    return {
+        "preference": os.environ.get(f"{prefix}_READ_PREFERENCE", preference),
+        "concern": os.environ.get(f"{prefix}_READ_CONCERN", concern),
+        # -1 means no limit; otherwise at least 90 seconds
+        "max_staleness": int(os.environ.get(f"{prefix}_MAX_STALENESS_SECONDS", max_staleness)),
+    }
+
+
 class Config:
-    MONGO_URI = os.environ["MONGO_PATH"]
+    # Checked when the first connection is made rather than at import
+    MONGO_URI = os.environ.get("MONGO_PATH")
+    # Per-process connection pool; each forked worker builds its own client. With
+    # SERVING_MODE=async a worker has two pools of this size (the sync client and the
+    # AsyncMongoClient), so budget up to 2 x MONGO_MAX_POOL_SIZE x workers connections
+    MONGO_MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", 50))
+    MONGO_MIN_POOL_SIZE = int(os.environ.get("MONGO_MIN_POOL_SIZE", 0))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", 2000))
+    # "sync" runs each request's queries one after another on the PyMongo client;
+    # "async" fans them out concurrently on the process's AsyncMongoClient (async_models.py)
+    SERVING_MODE = os.environ.get("SERVING_MODE", "sync")
+
+    # Where each group of public reads is sent on a replica set (see models.read_collection).
+    # Feeds and search tolerate a lagging secondary: at most max_staleness seconds, plus
+    # ARTICLE_CACHE_TTL once cached. Comments default to the primary because clients reload
+    # the list right after posting. Reads of a user's own data (profile, ratings,
+    # collections) aren't routed and always go to the primary, so they see the user's writes
+    READ_ROUTES = {
+        "feed": read_route("feed", "secondaryPreferred", max_staleness=120),
+        "search": read_route("search", "secondaryPreferred", max_staleness=120),
+        "stats": read_route("stats", "secondaryPreferred", max_staleness=120),
+        "comments": read_route("comments", "primary"),
+    }
+
+    # Documents fetched per round trip when streaming the full article feed
+    STREAM_BATCH_SIZE = int(os.environ.get("STREAM_BATCH_SIZE", 200))
+
+    # In-process cache for article feeds and single articles (ARTICLE_CACHE_TTL=0 disables it)
+    ARTICLE_CACHE_TTL = int(os.environ.get("ARTICLE_CACHE_TTL", 60))
+    ARTICLE_CACHE_MAX_ENTRIES = int(os.environ.get("ARTICLE_CACHE_MAX_ENTRIES", 1024))
+    ARTICLE_CACHE_MAX_BYTES = int(os.environ.get("ARTICLE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+    # gzip/brotli for JSON responses of at least COMPRESSION_MIN_SIZE bytes (compression.py)
+    COMPRESSION_ENABLED = os.environ.get("COMPRESSION_ENABLED", "1") == "1"
+    COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", 1024))
+    COMPRESSION_GZIP_LEVEL = int(os.environ.get("COMPRESSION_GZIP_LEVEL", 6))
+    COMPRESSION_BROTLI_QUALITY = int(os.environ.get("COMPRESSION_BROTLI_QUALITY", 5))
+
+    # Paginated totals come from the materialized facets (article_facets). Once they are
+    # older than FACETS_MAX_AGE seconds a read starts one background refresh per worker and
+    # is answered from the stale copy meanwhile. They are also refreshed after ingestion
+    # (POST /api/cache/invalidate) and, if FACETS_REFRESH_SECONDS is set, on that interval
+    FACETS_MAX_AGE = int(os.environ.get("FACETS_MAX_AGE", 3600))
+    FACETS_REFRESH_SECONDS = int(os.environ.get("FACETS_REFRESH_SECONDS", 0))
+
+    # Follow a change stream (needs a replica set) to invalidate cached articles precisely
+    # and push updates to /api/articles/live; see live.py
+    LIVE_UPDATES_ENABLED = os.environ.get("LIVE_UPDATES_ENABLED", "0") == "1"
+    # Resume tokens are saved under this name so a restarted worker picks up where it left off
+    LIVE_WATCHER_NAME = os.environ.get("LIVE_WATCHER_NAME", "api")
+    # Recent events kept for clients reconnecting with Last-Event-ID
+    LIVE_HISTORY_SIZE = int(os.environ.get("LIVE_HISTORY_SIZE", 1000))
+    LIVE_HEARTBEAT_SECONDS = int(os.environ.get("LIVE_HEARTBEAT_SECONDS", 15))
+
+    # Serve /api/articles and /api/articles/<id> from undecoded BSON converted to JSON by
+    # python-bsonjs; ignored when bsonjs isn't installed
+    RAW_BSON_READS = os.environ.get("RAW_BSON_READS", "0") == "1"
+    # Each worker compares its article cache against the shared generation that POST
+    # /api/cache/invalidate bumps at most this often, so an invalidation reaches every
+    # worker within this many seconds
+    CACHE_GENERATION_CHECK_SECONDS = int(os.environ.get("CACHE_GENERATION_CHECK_SECONDS", 5))
+    # Shared secret the ingestion job sends to POST /api/cache/invalidate
+    CACHE_INVALIDATION_TOKEN = os.environ.get("CACHE_INVALIDATION_TOKEN")
+
+    GOOGLE_CLIENT_ID = os.environ.get(
+        "GOOGLE_CLIENT_ID", "924933737757-s0f1a66cdpi2qesbgrmov0bttu8tq7ba.apps.googleusercontent.com")
+    GOOGLE_CERTS_URL = os.environ.get("GOOGLE_CERTS_URL", "https://www.googleapis.com/oauth2/v1/certs")
+    GOOGLE_TOKEN_URL = os.environ.get("GOOGLE_TOKEN_URL", "https://oauth2.googleapis.com/token")
+    # Connections kept alive per host for outbound auth calls
+    HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", 10))
+
+    # Serve Prometheus metrics at /metrics and record Mongo command/pool timings (metrics.py)
+    METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+
+    # Warn at startup about declared indexes that are missing (see indexes.py)
+    CHECK_INDEXES_ON_STARTUP = os.environ.get("CHECK_INDEXES_ON_STARTUP", "1") == "1"
 
 
 class TestingConfig(Config):
-    MONGO_URI = os.environ["MONGO_TEST_PATH"]
+    MONGO_URI = os.environ.get("MONGO_TEST_PATH")
+    # Tests read back what they just wrote
+    READ_ROUTES = {route: read_route(route, "primary") for route in Config.READ_ROUTES}
+
+
+def get_config():
+    """The config class selected by FLASK_ENV."""
+    return TestingConfig if os.getenv("FLASK_ENV") == "testing" else Config
@@ -1,23 +1,146 @@
 import datetime
+import hmac
 import os
+import queue
+import threading
+import time
 
-from flask import request, jsonify, Flask
-from google.auth.transport import requests as google_requests
-from google.oauth2 import id_token
-import requests
+from flask import request, jsonify, Blueprint, Flask, Response, current_app, stream_with_context
+from flask_cors import CORS
+from pymongo.errors import OperationFailure
 
+import compression
+import google_certs
 import models
-from models import db
-
-app = Flask(__name__)
-
-from flask_cors import CORS
+from json_provider import OrjsonProvider
+from config import get_config
 
-CORS(app, origins=["http://localhost:5173", "http://localhost:8000"])
+api = Blueprint("api", __name__)
 
 GOOGLE_CLIENT_SECRET = os.environ.get("GOOGLE_SECRET")
 
-@app.route("/api/auth/google", methods=["POST"])
+
+def create_app(config_object=None):
+    """
+    Build the Flask app. Nothing here waits on Mongo: each process opens its own
+    client on first query, so the app is safe to create before gunicorn forks workers.
+    """
+    app = Flask(__name__)
+    app.config.from_object(config_object or get_config())
+    # Encodes ObjectId and datetime itself, so models return documents unformatted
+    app.json = OrjsonProvider(app)
+    models.configure(app.config)
+
+    CORS(app, origins=["http://localhost:5173", "http://localhost:8000"], expose_headers=["X-Next-Cursor"])
+
+    # One pooled session for every outbound auth call, and certs cached per Cache-Control
+    http_session = google_certs.create_http_session(app.config["HTTP_POOL_SIZE"])
+    app.extensions["http_session"] = http_session
+    app.extensions["google_cert_cache"] = google_certs.GoogleCertCache(http_session, app.config["GOOGLE_CERTS_URL"])
+
+    app.register_blueprint(api)
+    compression.init_app(app)
+
+    if app.config["METRICS_ENABLED"]:
+        import metrics
+        metrics.init_app(app)
+
+    # Background Mongo work (index check, facet refresh, change-stream watcher) starts with
+    # each process's first request, never in the gunicorn master, which must not open a
+    # client before it forks
+    app.before_request(start_background_tasks)
+
+    return app
+
+
+_background_pid = None
+_background_lock = threading.Lock()
+
+
+def _reset_background_after_fork():
+    global _background_pid, _background_lock
+    _background_pid = None
+    _background_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_background_after_fork)
+
+
+def start_background_tasks():
+    """
+    before_request hook launching the worker's background threads the first time this
+    process serves a request; a forked worker has a new pid, so it launches its own.
+    """
+    global _background_pid
+    if _background_pid != os.getpid():
+        with _background_lock:
+            if _background_pid != os.getpid():
+                settings = current_app.config
+                if settings["CHECK_INDEXES_ON_STARTUP"]:
+                    import indexes
+                    # In the background so a slow database never delays the request
+                    threading.Thread(target=indexes.check_indexes_on_startup, daemon=True).start()
+                if settings["FACETS_REFRESH_SECONDS"] > 0:
+                    threading.Thread(target=refresh_facets_periodically, args=(settings["FACETS_REFRESH_SECONDS"],),
+                                     daemon=True).start()
+                if settings["LIVE_UPDATES_ENABLED"]:
+                    import live
+                    live.ensure_started()
+                _background_pid = os.getpid()
+
+
+def refresh_facets_periodically(interval):
+    """
+    Refresh the facets about every interval seconds. Every worker runs this, but one that
+    finds them refreshed within the interval (by another worker or ingestion) skips its turn.
+    """
+    while True:
+        try:
+            if not models.facets_are_fresh(models.fetch_article_facets(primary=True), max_age=interval):
+                models.refresh_article_facets_once()
+        except Exception as e:
+            print("Error refreshing article facets:", e)
+        time.sleep(interval)
+
+
+def async_mode():
+    return current_app.config["SERVING_MODE"] == "async"
+
+
+def verify_google_token(token):
+    return google_certs.verify_google_id_token(
+        token, current_app.extensions["google_cert_cache"], current_app.config["GOOGLE_CLIENT_ID"])
+
+
+def cached_json_response(key, build):
+    """
+    Serve a JSON body from the article cache, building and serializing it on a miss.
+    Returns None when build() finds nothing, which is never cached.
+    """
+    def build_body():
+        data = build()
+        return None if data is None else current_app.json.dumps_bytes(data)
+
+    return cached_body_response(key, build_body)
+
+
+def cached_body_response(key, build_body):
+    """
+    Like cached_json_response, for a build_body() that returns JSON bytes itself. The
+    entry keeps compressed variants of the body, so cache hits are never recompressed.
+    """
+    models.sync_article_cache()
+    entry = models.article_cache.get(key)
+    if entry is None:
+        body = build_body()
+        if body is None:
+            return None
+        entry = compression.CachedBody(body + b"\n")
+        models.article_cache.set(key, entry, size=entry.size)
+    return entry.response(current_app.json.mimetype)
+
+
+@api.route("/api/auth/google", methods=["POST"])
 def google_auth():
     token = request.json.get("token")
 
@@ -25,8 +148,7 @@ def google_auth():
         return jsonify({"error": "Missing token"}), 400
 
     try:
-        info = id_token.verify_oauth2_token(token, google_requests.Request(),
-            '924933737757-s0f1a66cdpi2qesbgrmov0bttu8tq7ba.apps.googleusercontent.com')
+        info = verify_google_token(token)
 
         user_data = {
             "google_id": info["sub"],
@@ -47,16 +169,166 @@ def google_auth():
 Example query
 /api/articles?genre=World&source=BBC-News
 
+Streaming (one JSON document per line)
+/api/articles?genre=World&stream=1&batch_size=100
+or send the header  Accept: application/x-ndjson
+
+Every article-returning endpoint accepts fields=, either a preset (card, full)
+or a comma-separated list such as fields=title,summary,published
 """
 
+NDJSON_MIMETYPE = "application/x-ndjson"
+MAX_STREAM_BATCH_SIZE = 1000
 
-@app.route("/api/articles", methods=["GET"])
+
+def wants_ndjson():
+    if request.args.get("stream") in ("1", "true", "ndjson"):
+        return True
+    return request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+
+@api.route("/api/articles", methods=["GET"])
 def get_articles():
     genre = request.args.get("genre")
     source = request.args.get("source")
-    articles = models.fetch_all_articles(genre, source)
+    fields = request.args.get("fields")
+
+    if not models.is_valid_fields(fields):
+        return jsonify({"error": "Invalid fields"}), 400
+
+    if wants_ndjson():
+        batch_size = request.args.get("batch_size", default=None, type=int)
+        if batch_size is not None:
+            batch_size = max(1, min(batch_size, MAX_STREAM_BATCH_SIZE))
+
+        def generate():
+            for article in models.iter_all_articles(genre, source, batch_size, fields):
+                yield current_app.json.dumps_bytes(article) + b"\n"
+
+        return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE), 200
+
+    key = models.article_cache_key("feed", genre, source, fields=fields)
+    if models.raw_json_enabled():
+        return cached_body_response(key, lambda: models.fetch_all_articles_json(genre, source, fields)), 200
+    return cached_json_response(key, lambda: models.fetch_all_articles(genre, source, fields)), 200
+
+
+"""
+Example query
+/api/articles/live?genre=World
+/api/articles/live?genre=World&events=article,comment,rating
+
+A Server-Sent Events stream of changes, instead of polling /api/articles. Article
+events carry the article's card fields; comment and rating events carry its id.
+Reconnecting clients send Last-Event-ID and get the events they missed. Each open
+stream holds a worker thread, so serve it with a threaded or async gunicorn worker.
+"""
+
+LIVE_EVENT_TYPES = {"article", "comment", "rating"}
 
-    return jsonify(articles), 200
+
+@api.route("/api/articles/live", methods=["GET"])
+def live_articles():
+    if not current_app.config["LIVE_UPDATES_ENABLED"]:
+        return jsonify({"error": "Live updates are disabled"}), 404
+
+    import live
+    genre = request.args.get("genre")
+    types = set(request.args.get("events", "article").split(","))
+    if not types <= LIVE_EVENT_TYPES:
+        return jsonify({"error": f"events must be among {', '.join(sorted(LIVE_EVENT_TYPES))}"}), 400
+
+    subscriber, backlog = live.broadcaster.subscribe(request.headers.get("Last-Event-ID"))
+    broadcaster = live.broadcaster
+    heartbeat = current_app.config["LIVE_HEARTBEAT_SECONDS"]
+
+    def generate():
+        try:
+            yield b"retry: 3000\n\n"
+            for event in backlog:
+                if event.matches(genre, types):
+                    yield event.encode()
+            while not subscriber.dropped:
+                try:
+                    event = subscriber.queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    # Keeps proxies from closing an idle connection
+                    yield b": keepalive\n\n"
+                    continue
+                if event.matches(genre, types):
+                    yield event.encode()
+        finally:
+            broadcaster.unsubscribe(subscriber)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(generate(), mimetype="text/event-stream", headers=headers)
+
+
+"""
+Example query
+/api/articles/facets
+
+Article counts per genre and per source under the feed's language filter, for filter
+menus. Served from the materialized summary. Once it is older than FACETS_MAX_AGE
+the stored copy is still served while one background refresh per worker recomputes it.
+"""
+
+
+@api.route("/api/articles/facets", methods=["GET"])
+def get_article_facets():
+    try:
+        # Possibly stale while a background refresh runs; computed here only the first time
+        facets = models.current_article_facets() or models.refresh_article_facets()
+    except Exception as e:
+        print("Error fetching article facets:", e)
+        return jsonify({"error": "Failed to fetch facets."}), 500
+
+    return jsonify({
+        "total": facets["total"],
+        "genres": facets["genres"],
+        "sources": facets["sources"],
+        "computed_at": facets["computed_at"]
+    }), 200
+
+
+"""
+Example queries
+/api/articles/batch?ids=67bf73248d2ae870c932d262,67bf73248d2ae870c932d263&fields=card
+POST /api/articles/batch  {"ids": [...], "fields": "card"}  for lists too long for a URL
+
+Articles come back in request order; ids that aren't ObjectIds are listed under
+"invalid" and ids with no article under "missing".
+"""
+
+MAX_ARTICLE_BATCH_IDS = 500
+
+
+@api.route("/api/articles/batch", methods=["GET", "POST"])
+def get_articles_batch():
+    if request.method == "POST":
+        data = request.get_json(silent=True) or {}
+        ids = data.get("ids")
+        fields = data.get("fields", request.args.get("fields"))
+        if not isinstance(ids, list) or not all(isinstance(article_id, str) for article_id in ids):
+            return jsonify({"error": "Expected a list of id strings under 'ids'"}), 400
+    else:
+        ids = [article_id for article_id in request.args.get("ids", "").split(",") if article_id]
+        fields = request.args.get("fields")
+
+    if not ids:
+        return jsonify({"error": "Missing ids"}), 400
+    if len(ids) > MAX_ARTICLE_BATCH_IDS:
+        return jsonify({"error": f"At most {MAX_ARTICLE_BATCH_IDS} ids per request"}), 400
+    if not models.is_valid_fields(fields):
+        return jsonify({"error": "Invalid fields"}), 400
+
+    try:
+        articles, invalid_ids, missing_ids = models.fetch_articles_in_order(ids, fields)
+    except Exception as e:
+        print("Error fetching article batch:", e)
+        return jsonify({"error": "Failed to fetch articles."}), 500
+
+    return jsonify({"data": articles, "invalid": invalid_ids, "missing": missing_ids}), 200
 
 
 """
@@ -65,31 +337,96 @@ Example query
 """
 
 
-@app.route("/api/articles/<string:id>")
+@api.route("/api/articles/<string:id>")
 def get_article_by_id(id):
-    article = models.fetch_article_by_id(id)
-    if article:
-        return article, 200
+    fields = request.args.get("fields")
+    if not models.is_valid_fields(fields):
+        return jsonify({"error": "Invalid fields"}), 400
+
+    key = models.article_cache_key("article", id, fields=fields)
+    if models.raw_json_enabled():
+        response = cached_body_response(key, lambda: models.fetch_article_json(id, fields))
+    else:
+        response = cached_json_response(key, lambda: models.fetch_article_by_id(id, fields))
+    if response:
+        return response, 200
     return jsonify({"error": "Article not found"}), 404
 
 
-@app.route("/api/articles/search", methods=["GET"])
+"""
+Example query
+/api/articles/search?q=election&limit=20
+
+Results are ranked by relevance. When more results exist the response carries an
+X-Next-Cursor header; send it back as cursor= to get the next page.
+"""
+
+DEFAULT_SEARCH_LIMIT = 50
+MAX_SEARCH_LIMIT = 100
+
+
+@api.route("/api/articles/search", methods=["GET"])
 def search_articles():
     query = request.args.get("q")
+    fields = request.args.get("fields")
+    limit = request.args.get("limit", default=DEFAULT_SEARCH_LIMIT, type=int)
+    cursor = request.args.get("cursor")
 
     if not query:
         return jsonify({"error": "Missing search query"}), 400
+    if not models.is_valid_fields(fields):
+        return jsonify({"error": "Invalid fields"}), 400
 
-    articles = models.search_articles(query)
-
-    return jsonify(articles), 200
+    limit = max(1, min(limit, MAX_SEARCH_LIMIT))
 
+    try:
+        articles, next_cursor = models.search_articles(query, fields, limit, cursor)
+    except ValueError:
+        return jsonify({"error": "Invalid cursor"}), 400
+    except OperationFailure as e:
+        if e.code != models.INDEX_NOT_FOUND:
+            raise
+        # The article_search_text index hasn't been built; `python indexes.py ensure` creates it
+        print("Search failed, text index missing:", e)
+        return jsonify({"error": "Search index unavailable"}), 503
+
+    response = jsonify(articles)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response, 200
+
+
+@api.route("/api/cache/stats", methods=["GET"])
+def get_cache_stats():
+    """Stats for the cache of the worker process that answers; each worker has its own."""
+    return jsonify(dict(models.article_cache.stats(), pid=os.getpid())), 200
+
+
+@api.route("/api/cache/invalidate", methods=["POST"])
+def invalidate_cache():
+    """
+    Called by the ingestion job once new stories are stored. This worker's cache is
+    dropped at once and every other worker's within CACHE_GENERATION_CHECK_SECONDS.
+    """
+    token = current_app.config["CACHE_INVALIDATION_TOKEN"]
+    if not token or not hmac.compare_digest(request.headers.get("X-Cache-Token", ""), token):
+        return jsonify({"error": "Forbidden"}), 403
 
-if __name__ == "__main__":
-    app.run(debug=True)
+    try:
+        generation = models.publish_article_cache_invalidation()
+    except Exception as e:
+        print("Error publishing cache invalidation:", e)
+        return jsonify({"error": "Failed to invalidate cache"}), 500
+    try:
+        models.refresh_article_facets()
+        facets_refreshed = True
+    except Exception as e:
+        print("Error refreshing article facets:", e)
+        facets_refreshed = False
+    return jsonify({"message": "Cache invalidated", "generation": generation, "facets_refreshed": facets_refreshed}), 200
 
 
-@app.route("/api/comments/<string:id>", methods=["POST"])
+@api.route("/api/comments/<string:id>", methods=["POST"])
 def post_comment(id):
     data = request.get_json()
     author = data.get("user_id")
@@ -109,7 +446,49 @@ def post_comment(id):
         return jsonify({"error": "Failed to add comment"}), 500
 
 
-@app.route("/api/comments/<string:comment_id>", methods=["DELETE"])
+MAX_BATCH_SIZE = 500
+
+
+def batch_response(results):
+    inserted = sum(1 for result in results if result["ok"])
+    body = {"inserted": inserted, "failed": len(results) - inserted, "results": results}
+    if inserted == len(results):
+        return jsonify(body), 201
+    if inserted:
+        # Multi-Status when only some items were saved
+        return jsonify(body), 207
+    # Nothing saved: the client's fault only if every item was invalid
+    if any(result.get("server_error") for result in results):
+        return jsonify(body), 500
+    return jsonify(body), 400
+
+
+def get_batch_items(key):
+    """The list under key in the JSON body, or an error response."""
+    data = request.get_json(silent=True) or {}
+    items = data.get(key)
+    if not isinstance(items, list) or not items:
+        return None, (jsonify({"error": f"Expected a non-empty list under '{key}'"}), 400)
+    if len(items) > MAX_BATCH_SIZE:
+        return None, (jsonify({"error": f"At most {MAX_BATCH_SIZE} items per batch"}), 400)
+    return items, None
+
+
+"""
+Example body for POST /api/comments/batch
+{"comments": [{"article_id": "...", "user_id": "...", "comment": "..."}, ...]}
+"""
+
+
+@api.route("/api/comments/batch", methods=["POST"])
+def post_comments_batch():
+    items, error = get_batch_items("comments")
+    if error:
+        return error
+    return batch_response(models.save_comments_batch(items))
+
+
+@api.route("/api/comments/<string:comment_id>", methods=["DELETE"])
 def delete_comment(comment_id):
     try:
         result = models.delete_comment_by_id(comment_id)
@@ -122,21 +501,50 @@ def delete_comment(comment_id):
         return jsonify({"error": "Server error"}), 500
 
 
-@app.route("/api/comments/<string:article_id>", methods=["GET"])
+"""
+Example queries
+/api/comments/67bf73248d2ae870c932d262?order=newest&limit=20&total=1
+/api/comments/67bf73248d2ae870c932d262?order=newest&limit=20&cursor=<next_cursor from the previous page>
+
+order is newest (default) or oldest; limit defaults to 50 and is capped at 200.
+"""
+
+
+@api.route("/api/comments/<string:article_id>", methods=["GET"])
 def get_comments_by_article_id(article_id):
     limit = request.args.get("limit", default=None, type=int)
+    order = request.args.get("order", default="newest")
+    cursor = request.args.get("cursor")
+    with_total = request.args.get("total") in ("1", "true")
+
+    if order not in models.COMMENT_ORDERS:
+        return jsonify({"error": "order must be newest or oldest"}), 400
+    if limit is not None and limit < 1:
+        return jsonify({"error": "limit must be positive"}), 400
+
     try:
-        result = models.fetch_comments_by_id(article_id, limit)
-        if result:
-            return jsonify({"msg": "Retrieved comments.", "data": result}), 200
+        if async_mode():
+            import async_models
+            result, next_cursor, total = async_models.run(
+                async_models.fetch_comments_by_id(article_id, limit, order, cursor, with_total))
         else:
-            return jsonify({"error": "Failed to retrieve comments."}), 404
+            result, next_cursor, total = models.fetch_comments_by_id(article_id, limit, order, cursor, with_total)
+    except ValueError:
+        return jsonify({"error": "Invalid cursor"}), 400
     except Exception as e:
         print("Error is: ", e)
         return jsonify({"error": "Server error."}), 500
 
+    if not result and not cursor:
+        return jsonify({"error": "Failed to retrieve comments."}), 404
+
+    body = {"msg": "Retrieved comments.", "data": result, "next_cursor": next_cursor}
+    if with_total:
+        body["total"] = total
+    return jsonify(body), 200
 
-@app.route("/api/ratings/<string:article_id>", methods=['POST'])
+
+@api.route("/api/ratings/<string:article_id>", methods=['POST'])
 def post_new_rating(article_id):
     data = request.get_json()
     user_id = data.get("user_id")
@@ -146,16 +554,36 @@ def post_new_rating(article_id):
 
     if not user_id or accuracy is None or bias is None or insight is None:
         return jsonify({"error": "Missing one or more required fields."})
+    # A value the summary's $inc can't apply would leave article_stats out of step with the ratings
+    if not all(models.is_rating_value(value) for value in (accuracy, bias, insight)):
+        return jsonify({"error": "accuracy, bias and insight must be numbers"}), 400
 
     new_rating = models.save_rating(article_id, user_id, accuracy, bias, insight)
 
     if new_rating:
+        # Convert datetime to string for JSON serialization
+        if isinstance(new_rating.get("timestamp"), datetime.datetime):
+            new_rating["timestamp"] = new_rating["timestamp"].isoformat()
         return jsonify({"msg": "New rating submitted", "data": new_rating}), 201
     else:
         return jsonify({"error": "Failed to submit rating"}), 500
 
 
-@app.route("/api/ratings/<string:article_id>", methods=["GET"])
+"""
+Example body for POST /api/ratings/batch
+{"ratings": [{"article_id": "...", "user_id": "...", "accuracy": 80, "bias": 20, "insight": 65}, ...]}
+"""
+
+
+@api.route("/api/ratings/batch", methods=["POST"])
+def post_ratings_batch():
+    items, error = get_batch_items("ratings")
+    if error:
+        return error
+    return batch_response(models.save_ratings_batch(items))
+
+
+@api.route("/api/ratings/<string:article_id>", methods=["GET"])
 def get_ratings_by_article_id(article_id):
     try:
         ratings = models.fetch_ratings_by_article_id(article_id)
@@ -164,7 +592,67 @@ def get_ratings_by_article_id(article_id):
         return jsonify({"error": "Failed to fetch ratings properly."}), 500
 
 
-@app.route("/api/user/<string:user_id>", methods=["GET"])
+MAX_SUMMARY_IDS = 200
+
+
+@api.route("/api/ratings/<string:article_id>/summary", methods=["GET"])
+def get_rating_summary(article_id):
+    try:
+        return jsonify(models.fetch_rating_summary(article_id)), 200
+    except Exception as e:
+        print("Error fetching rating summary:", e)
+        return jsonify({"error": "Failed to fetch rating summary."}), 500
+
+
+"""
+Example query
+/api/ratings/summary?ids=67bf73248d2ae870c932d262,67bf73248d2ae870c932d263
+"""
+
+
+@api.route("/api/ratings/summary", methods=["GET"])
+def get_rating_summaries():
+    ids = [article_id for article_id in request.args.get("ids", "").split(",") if article_id]
+
+    if not ids:
+        return jsonify({"error": "Missing ids"}), 400
+    if len(ids) > MAX_SUMMARY_IDS:
+        return jsonify({"error": f"At most {MAX_SUMMARY_IDS} ids per request"}), 400
+
+    try:
+        return jsonify({"data": models.fetch_rating_summaries(ids)}), 200
+    except Exception as e:
+        print("Error fetching rating summaries:", e)
+        return jsonify({"error": "Failed to fetch rating summaries."}), 500
+
+
+"""
+Example query
+/api/articles/stats?ids=67bf73248d2ae870c932d262,67bf73248d2ae870c932d263
+
+Comment and rating counts plus mean ratings, from counters kept up to date on every write.
+"""
+
+MAX_STATS_IDS = 500
+
+
+@api.route("/api/articles/stats", methods=["GET"])
+def get_article_stats():
+    ids = [article_id for article_id in request.args.get("ids", "").split(",") if article_id]
+
+    if not ids:
+        return jsonify({"error": "Missing ids"}), 400
+    if len(ids) > MAX_STATS_IDS:
+        return jsonify({"error": f"At most {MAX_STATS_IDS} ids per request"}), 400
+
+    try:
+        return jsonify({"data": models.fetch_article_stats(ids)}), 200
+    except Exception as e:
+        print("Error fetching article stats:", e)
+        return jsonify({"error": "Failed to fetch article stats."}), 500
+
+
+@api.route("/api/user/<string:user_id>", methods=["GET"])
 def get_user_details_by_user_id(user_id):
     try:
         details = models.fetch_details_by_user_id(user_id)
@@ -175,7 +663,7 @@ def get_user_details_by_user_id(user_id):
         return jsonify({"error": "Couldn't get user details"})
 
 
-@app.route("/api/collections/create-new", methods=["POST"])
+@api.route("/api/collections/create-new", methods=["POST"])
 def create_new_user_collection():
     try:
         data = request.get_json()
@@ -200,7 +688,7 @@ def create_new_user_collection():
         return jsonify({"error": "Internal server error"}), 500
 
 
-@app.route("/api/collections/add-article/", methods=["POST"])
+@api.route("/api/collections/add-article/", methods=["POST"])
 def add_article_to_user_collection():
     try:
         data = request.get_json()
@@ -223,7 +711,7 @@ def add_article_to_user_collection():
         return jsonify({"error": "Internal server error"}), 500
 
 
-@app.route("/api/user/<string:user_id>/comments", methods=["GET"])
+@api.route("/api/user/<string:user_id>/comments", methods=["GET"])
 def get_comments_by_user_id(user_id):
     try:
         result = models.fetch_comments_by_user_id(user_id)
@@ -236,35 +724,80 @@ def get_comments_by_user_id(user_id):
         return jsonify({"error": "Server error."}), 500
 
 
-@app.route("/api/articles/paginated", methods=["GET"])
+"""
+Example queries
+/api/articles/paginated?genre=World&page=3&limit=20
+/api/articles/paginated?genre=World&limit=20&cursor=
+/api/articles/paginated?genre=World&limit=20&cursor=<next_cursor from the previous page>
+
+Passing cursor (even empty) switches to keyset mode, which skips the total count.
+"""
+
+DEFAULT_PAGE_LIMIT = 20
+MAX_PAGE_LIMIT = 100
+
+
+@api.route("/api/articles/paginated", methods=["GET"])
 def get_articles_paginated():
     genre = request.args.get("genre")
     source = request.args.get("source")
     page = request.args.get("page", default=1, type=int)
-    limit = request.args.get("limit", default=20, type=int)
+    limit = request.args.get("limit", default=DEFAULT_PAGE_LIMIT, type=int)
+    cursor = request.args.get("cursor")
+    fields = request.args.get("fields")
+
+    if not models.is_valid_fields(fields):
+        return jsonify({"error": "Invalid fields"}), 400
 
-    articles = models.fetch_all_articles_paginated(genre, source, page, limit)
+    # limit(0) would mean no limit to Mongo, so a page always holds 1..MAX_PAGE_LIMIT articles
+    limit = max(1, min(limit, MAX_PAGE_LIMIT))
+
+    kind = "paginated" if cursor is None else "paginated_cursor"
+    key = models.article_cache_key(kind, genre, source, page, cursor, limit, fields=fields)
+    try:
+        response = cached_json_response(
+            key, lambda: build_paginated_body(genre, source, page, limit, cursor, fields))
+    except ValueError:
+        return jsonify({"error": "Invalid cursor"}), 400
+
+    return response, 200
+
+
+def build_paginated_body(genre, source, page, limit, cursor, fields):
+    if async_mode():
+        import async_models
+        # The page query and the total count run concurrently
+        articles, next_cursor, total_count = async_models.run(async_models.fetch_all_articles_paginated(
+            genre, source, page, limit, cursor, fields, with_total=cursor is None))
+    else:
+        articles, next_cursor = models.fetch_all_articles_paginated(genre, source, page, limit, cursor, fields)
+        total_count = None
+
+    if cursor is not None:
+        return {
+            "limit": limit,
+            "count": len(articles),
+            "next_cursor": next_cursor,
+            "data": articles
+        }
 
     # Get the total count for pagination info
     # This is needed since we're returning just the paginated data
-    query = {}
-    if genre:
-        query["genre"] = genre
-    if source:
-        query["author"] = source
-    total_count = models.db.articles.count_documents(query)
+    if total_count is None:
+        total_count = models.count_feed_articles(genre, source)
 
-    return jsonify({
+    return {
         "page": page,
         "limit": limit,
         "count": len(articles),
         "total": total_count,
         "pages": (total_count + limit - 1) // limit,
+        "next_cursor": next_cursor,
         "data": articles
-    }), 200
+    }
 
 
-@app.route("/api/collections/<string:user_id>", methods=["GET"])
+@api.route("/api/collections/<string:user_id>", methods=["GET"])
 def get_user_collections(user_id):
     try:
         collections = models.fetch_user_collections(user_id)
@@ -277,11 +810,19 @@ def get_user_collections(user_id):
         return jsonify({"error": "Internal server error"}), 500
 
 
-@app.route("/api/collections/<string:user_id>/with-articles", methods=["GET"])
+@api.route("/api/collections/<string:user_id>/with-articles", methods=["GET"])
 def get_collections_with_articles(user_id):
     """Get all collections for a user with article details."""
+    fields = request.args.get("fields")
+    if not models.is_valid_fields(fields):
+        return jsonify({"error": "Invalid fields"}), 400
+
+    limit = request.args.get("limit", default=None, type=int)
+    if limit is not None and limit < 1:
+        return jsonify({"error": "limit must be positive"}), 400
+
     try:
-        collections = models.fetch_collections_with_articles(user_id)
+        collections = models.fetch_collections_with_articles(user_id, fields, limit)
         if collections:
             return jsonify(collections), 200
         else:
@@ -291,9 +832,47 @@ def get_collections_with_articles(user_id):
         return jsonify({"error": "Internal server error"}), 500
 
 
-@app.route("/api/user/<string:user_id>/ratings", methods=["GET"])
+"""
+Example queries
+/api/collections/<user_id>/items?collection=Reading&limit=50
+/api/collections/<user_id>/items?collection=Reading&limit=50&cursor=<next_cursor from the previous page>
+
+One collection's articles in the order they were added; accepts fields= like the feed.
+"""
+
+
+@api.route("/api/collections/<string:user_id>/items", methods=["GET"])
+def get_collection_items(user_id):
+    collection_name = request.args.get("collection")
+    limit = request.args.get("limit", default=None, type=int)
+    cursor = request.args.get("cursor")
+    fields = request.args.get("fields")
+
+    if not collection_name:
+        return jsonify({"error": "Missing collection"}), 400
+    if limit is not None and limit < 1:
+        return jsonify({"error": "limit must be positive"}), 400
+    if not models.is_valid_fields(fields):
+        return jsonify({"error": "Invalid fields"}), 400
+
+    try:
+        page = models.fetch_collection_items(user_id, collection_name, limit, cursor, fields)
+    except ValueError:
+        return jsonify({"error": "Invalid cursor"}), 400
+    except Exception as e:
+        print("Error fetching collection items:", e)
+        return jsonify({"error": "Internal server error"}), 500
+
+    if page is None:
+        return jsonify({"error": "Collection not found"}), 404
+    return jsonify(page), 200
+
+
+@api.route("/api/user/<string:user_id>/ratings", methods=["GET"])
 def get_ratings_by_user_id(user_id):
     limit = request.args.get("limit", default=None, type=int)
+    if limit is not None and limit < 1:
+        return jsonify({"error": "limit must be positive"}), 400
     try:
         result = models.fetch_ratings_by_user_id(user_id, limit)
         if result:
@@ -305,7 +884,7 @@ def get_ratings_by_user_id(user_id):
         return jsonify({"error": "Server error."}), 500
 
 
-@app.route("/api/collections/delete", methods=["DELETE"])
+@api.route("/api/collections/delete", methods=["DELETE"])
 def delete_collection():
     try:
         data = request.get_json()
@@ -326,7 +905,7 @@ def delete_collection():
         return jsonify({"error": "Internal server error"}), 500
 
 
-@app.route("/api/collections/remove-article", methods=["POST"])
+@api.route("/api/collections/remove-article", methods=["POST"])
 def remove_article_from_collection():
     try:
         data = request.get_json()
@@ -347,7 +926,7 @@ def remove_article_from_collection():
         return jsonify({"error": "Internal server error"}), 500
 
 
-@app.route("/api/collections/rename", methods=["PATCH"])
+@api.route("/api/collections/rename", methods=["PATCH"])
 def rename_collection():
     try:
         data = request.get_json()
@@ -368,7 +947,7 @@ def rename_collection():
         return jsonify({"error": "Internal server error"}), 500
 
 
-@app.route("/api/auth/google/code", methods=["POST"])
+@api.route("/api/auth/google/code", methods=["POST"])
 def google_auth_code():
     code = request.json.get("code")
     redirect_uri = request.json.get("redirect_uri")
@@ -378,15 +957,16 @@ def google_auth_code():
 
     try:
         # Exchange code for token
-        token_request = requests.post(
-            "https://oauth2.googleapis.com/token",
+        token_request = current_app.extensions["http_session"].post(
+            current_app.config["GOOGLE_TOKEN_URL"],
             data={
                 "code": code,
-                "client_id": "924933737757-s0f1a66cdpi2qesbgrmov0bttu8tq7ba.apps.googleusercontent.com",
+                "client_id": current_app.config["GOOGLE_CLIENT_ID"],
                 "client_secret": GOOGLE_CLIENT_SECRET,
                 "redirect_uri": redirect_uri,
                 "grant_type": "authorization_code"
-            }
+            },
+            timeout=10
         )
 
         token_data = token_request.json()
@@ -400,11 +980,7 @@ def google_auth_code():
             return jsonify({"error": "No ID token in response"}), 400
 
         # Verify the token
-        info = id_token.verify_oauth2_token(
-            id_token_value,
-            google_requests.Request(),
-            "924933737757-s0f1a66cdpi2qesbgrmov0bttu8tq7ba.apps.googleusercontent.com"
-        )
+        info = verify_google_token(id_token_value)
 
         user_data = {
             "id": info["sub"],
@@ -420,3 +996,9 @@ def google_auth_code():
     except Exception as e:
         print("Google code verification failed:", e)
         return jsonify({"error": f"Invalid code: {str(e)}"}), 401
+
+
+app = create_app()
+
+if __name__ == "__main__":
+    app.run(debug=True)
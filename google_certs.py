@@ -0,0 +1,128 @@
+import json
+import re
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# google.auth (and the RSA code behind it) is imported on first verification to keep worker boot fast
+
+GOOGLE_OAUTH2_CERTS_URL = "https://www.googleapis.com/oauth2/v1/certs"
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+
+MAX_AGE_PATTERN = re.compile(r"max-age=(\d+)")
+
+
+def create_http_session(pool_size=10):
+    """A requests session with a keep-alive connection pool, shared by all outbound auth calls."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class GoogleCertCache:
+    """
+    Caches Google's token signing certificates for as long as Cache-Control max-age allows.
+
+    Once an entry is within refresh_ahead seconds of expiring, the next caller starts a
+    background refresh and keeps using the current certificates, so requests only block
+    on the network when the cache is empty or fully expired.
+    """
+
+    def __init__(self, session, certs_url=GOOGLE_OAUTH2_CERTS_URL, default_ttl=300, refresh_ahead=60,
+                 min_refresh_interval=30, timeout=5, clock=time.monotonic):
+        self.session = session
+        self.certs_url = certs_url
+        self.default_ttl = default_ttl
+        self.refresh_ahead = refresh_ahead
+        self.min_refresh_interval = min_refresh_interval
+        self.timeout = timeout
+        self.clock = clock
+
+        self._certs = None
+        self._expires_at = 0
+        self._fetched_at = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+        self.fetches = 0
+
+    def get(self):
+        """Return the current {key id: certificate} mapping, fetching only when needed."""
+        now = self.clock()
+        if self._certs is None or now >= self._expires_at:
+            with self._lock:
+                if self._certs is None or self.clock() >= self._expires_at:
+                    self._fetch()
+        elif now >= self._expires_at - self.refresh_ahead:
+            self._refresh_in_background()
+        return self._certs
+
+    def refresh(self):
+        """Fetch now, e.g. when a token names a key id we don't have yet. Rate limited."""
+        with self._lock:
+            if self._fetched_at is None or self.clock() - self._fetched_at >= self.min_refresh_interval:
+                self._fetch()
+        return self._certs
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                with self._lock:
+                    self._fetch()
+            except Exception as e:
+                # Keep serving the current certificates until they expire
+                print("Background Google cert refresh failed:", e)
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _fetch(self):
+        response = self.session.get(self.certs_url, timeout=self.timeout)
+        if response.status_code != 200:
+            from google.auth import exceptions
+            raise exceptions.TransportError(f"Could not fetch certificates at {self.certs_url}")
+
+        self.fetches += 1
+        self._certs = json.loads(response.content.decode("utf-8"))
+        self._fetched_at = self.clock()
+        self._expires_at = self._fetched_at + self._ttl(response.headers)
+
+    def _ttl(self, headers):
+        match = MAX_AGE_PATTERN.search(headers.get("Cache-Control", ""))
+        if not match:
+            return self.default_ttl
+        # Age is how long the response already sat in an upstream cache
+        age = int(headers.get("Age", 0) or 0)
+        return max(int(match.group(1)) - age, 0)
+
+
+def verify_google_id_token(token, cert_cache, audience):
+    """
+    Verify a Google ID token against cached certificates; a local CPU operation on the
+    common path. Raises ValueError if verification fails, like id_token.verify_oauth2_token.
+    """
+    from google.auth import exceptions, jwt
+
+    certs = cert_cache.get()
+
+    key_id = jwt.decode_header(token).get("kid")
+    if key_id and key_id not in certs:
+        # Google may have rotated keys before our cached copy expired
+        certs = cert_cache.refresh()
+
+    info = jwt.decode(token, certs=certs, audience=audience)
+
+    if info["iss"] not in GOOGLE_ISSUERS:
+        raise exceptions.GoogleAuthError(f"Wrong issuer. 'iss' should be one of the following: {GOOGLE_ISSUERS}")
+
+    return info
@@ -0,0 +1,215 @@
+"""
+Index specification for every collection the models query, plus tooling to apply and check it.
+
+Usage
+python indexes.py ensure     # create any missing index (idempotent)
+python indexes.py verify     # list declared indexes that are missing
+python indexes.py audit      # explain each model query and flag COLLSCAN plans
+"""
+import argparse
+import sys
+
+from bson import ObjectId
+from pymongo import DESCENDING, IndexModel, TEXT
+
+import models
+from models import db, FEED_SORT
+
+INDEXES = {
+    "articles": [
+        # Compound indexes matching FEED_SORT so keyset pages seek instead of skipping
+        IndexModel(FEED_SORT, name="feed_published_id"),
+        IndexModel([("genre", 1)] + FEED_SORT, name="feed_genre_published_id"),
+        IndexModel([("author", 1)] + FEED_SORT, name="feed_author_published_id"),
+        # Weighted text index backing search_articles. language_override points at a field
+        # articles never have, so a stray "language" value can't break inserts.
+        IndexModel(
+            [("title", TEXT), ("summary", TEXT), ("source", TEXT), ("genre", TEXT)],
+            name="article_search_text",
+            weights={"title": 10, "summary": 4, "source": 2, "genre": 2},
+            default_language="english",
+            language_override="search_language",
+        ),
+    ],
+    "comments": [
+        IndexModel([("article_id", 1), ("timestamp", DESCENDING), ("_id", DESCENDING)], name="comments_article_timestamp"),
+        IndexModel([("user_id", 1), ("timestamp", DESCENDING)], name="comments_user_timestamp"),
+    ],
+    "ratings": [
+        IndexModel([("article_id", 1)], name="ratings_article"),
+        # Serves the newest-first listing in fetch_ratings_by_user_id
+        IndexModel([("user_id", 1), ("timestamp", DESCENDING), ("_id", DESCENDING)], name="ratings_user_timestamp"),
+    ],
+    "users": [
+        IndexModel([("google_id", 1)], name="users_google_id"),
+    ],
+    "collection_meta": [
+        IndexModel([("user_id", 1), ("name", 1)], name="collection_meta_user_name", unique=True),
+    ],
+    "collection_items": [
+        # One entry per article per collection, which add_article_to_collection relies on
+        IndexModel([("collection_id", 1), ("article_id", 1)], name="collection_items_article", unique=True),
+        # Keyset pages of one collection in the order articles were added
+        IndexModel([("collection_id", 1), ("added_at", 1), ("_id", 1)], name="collection_items_order"),
+        # Every collection of a user at once (fetch_collection_article_ids)
+        IndexModel([("user_id", 1), ("collection_id", 1), ("added_at", 1), ("_id", 1)], name="collection_items_user"),
+    ],
+}
+
+
+def _key_pattern(key):
+    return tuple((field, direction) for field, direction in key.items()) if isinstance(key, dict) else tuple(key)
+
+
+def _existing_keys(collection):
+    """
+    {key pattern: unique} for the indexes already on a collection, so hand-made
+    duplicates under other names count. A pattern is unique if any index on it is.
+    """
+    existing = {}
+    for info in collection.list_indexes():
+        if "textIndexVersion" in info:
+            # Text indexes report their key as _fts/_ftsx; match them by kind instead
+            key = "text"
+        else:
+            key = _key_pattern(info["key"])
+        existing[key] = existing.get(key, False) or bool(info.get("unique"))
+    return existing
+
+
+def _spec_key(index):
+    key = index.document["key"]
+    if TEXT in key.values():
+        return "text"
+    return _key_pattern(key)
+
+
+def missing_indexes():
+    """Declared indexes that no existing index covers, as (collection, index name) pairs."""
+    missing = []
+    for collection_name, indexes in INDEXES.items():
+        existing = _existing_keys(db[collection_name])
+        missing += [(collection_name, index.document["name"]) for index in indexes if _spec_key(index) not in existing]
+    return missing
+
+
+def non_unique_indexes():
+    """
+    Declared unique indexes whose keys are only covered by a non-unique index, as
+    (collection, index name) pairs. ensure_indexes can't fix these: the existing index
+    has to be dropped (after removing any duplicates) so the unique one can be built.
+    """
+    mismatched = []
+    for collection_name, indexes in INDEXES.items():
+        existing = _existing_keys(db[collection_name])
+        mismatched += [
+            (collection_name, index.document["name"]) for index in indexes
+            if index.document.get("unique") and existing.get(_spec_key(index)) is False
+        ]
+    return mismatched
+
+
+def ensure_indexes():
+    """Create every declared index that is missing. Safe to run repeatedly. Returns the names created."""
+    created = []
+    for collection_name, indexes in INDEXES.items():
+        collection = db[collection_name]
+        existing = _existing_keys(collection)
+        to_create = [index for index in indexes if _spec_key(index) not in existing]
+        if to_create:
+            created += [f"{collection_name}.{name}" for name in collection.create_indexes(to_create)]
+    return created
+
+
+def check_indexes_on_startup():
+    """Log any missing index at startup. Never raises, so a slow or missing database can't block boot."""
+    try:
+        for collection_name, name in missing_indexes():
+            print(f"Warning: missing index {collection_name}.{name}; run `python indexes.py ensure`")
+        for collection_name, name in non_unique_indexes():
+            print(f"Warning: {collection_name}.{name} should be unique but the existing index is not")
+    except Exception as e:
+        print("Index check failed:", e)
+
+
+def audit_queries():
+    """
+    Representative filter/sort pairs for each model query, mirroring models.py.
+    Values are placeholders; only the shape matters to the planner.
+    """
+    article_id = str(ObjectId())
+    keyset = {"$or": [{"published": {"$lt": None}}, {"published": None, "_id": {"$lt": ObjectId()}}]}
+
+    return [
+        ("fetch_all_articles", "articles", models.build_feed_query(), FEED_SORT),
+        ("fetch_all_articles genre", "articles", models.build_feed_query(genre="World"), FEED_SORT),
+        ("fetch_all_articles source", "articles", models.build_feed_query(source="BBC-News"), FEED_SORT),
+        ("fetch_all_articles_paginated cursor", "articles",
+         dict(models.build_feed_query(genre="World"), **{"$and": [keyset]}), FEED_SORT),
+        ("search_articles", "articles", dict(models.build_feed_query(), **{"$text": {"$search": "news"}}), None),
+        ("fetch_article_by_id", "articles", {"_id": ObjectId(article_id)}, None),
+        ("fetch_comments_by_id", "comments", {"article_id": article_id}, [("timestamp", DESCENDING), ("_id", DESCENDING)]),
+        ("fetch_comments_by_user_id", "comments", {"user_id": "user"}, None),
+        ("fetch_ratings_by_article_id", "ratings", {"article_id": article_id}, None),
+        ("fetch_ratings_by_user_id", "ratings", {"user_id": "user"}, [("timestamp", DESCENDING), ("_id", DESCENDING)]),
+        ("fetch_details_by_user_id", "users", {"google_id": "user"}, None),
+        ("fetch_user_collections", "collection_meta", {"user_id": "user"}, None),
+        ("fetch_collection_article_ids", "collection_items", {"user_id": "user"},
+         [("collection_id", 1), ("added_at", 1), ("_id", 1)]),
+        ("fetch_collection_items", "collection_items", {"collection_id": ObjectId()}, [("added_at", 1), ("_id", 1)]),
+        ("fetch_rating_summary", "article_stats", {"_id": article_id}, None),
+        ("fetch_article_stats", "article_stats", {"_id": {"$in": [article_id]}}, None),
+        ("fetch_article_facets", "article_facets", {"_id": models.ARTICLE_FACETS_ID}, None),
+    ]
+
+
+def _plan_stages(plan):
+    """Every stage name in an explain plan, for both classic and slot-based engine layouts."""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _plan_stages(item)
+
+
+def audit():
+    """Explain each audit query. Returns the names of the ones whose winning plan is a COLLSCAN."""
+    collscans = []
+    for name, collection_name, query, sort in audit_queries():
+        cursor = db[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        winning_plan = cursor.explain()["queryPlanner"]["winningPlan"]
+        if "COLLSCAN" in set(_plan_stages(winning_plan)):
+            collscans.append(name)
+    return collscans
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage MongoDB indexes.")
+    parser.add_argument("command", choices=["ensure", "verify", "audit"])
+    args = parser.parse_args()
+
+    if args.command == "ensure":
+        created = ensure_indexes()
+        print(f"Created {len(created)} indexes" + (": " + ", ".join(created) if created else ""))
+        non_unique = non_unique_indexes()
+        for collection_name, name in non_unique:
+            print(f"Not unique: {collection_name}.{name}; drop the existing index and run ensure again")
+        sys.exit(1 if non_unique else 0)
+    elif args.command == "verify":
+        missing = missing_indexes()
+        non_unique = non_unique_indexes()
+        for collection_name, name in missing:
+            print(f"Missing {collection_name}.{name}")
+        for collection_name, name in non_unique:
+            print(f"Not unique: {collection_name}.{name}")
+        sys.exit(1 if missing or non_unique else 0)
+    else:
+        collscans = audit()
+        for name in collscans:
+            print(f"COLLSCAN: {name}")
+        sys.exit(1 if collscans else 0)
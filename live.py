@@ -0,0 +1,215 @@
+"""
+Change-stream watcher that keeps the article cache fresh and pushes live updates.
+
+Each worker process runs one ChangeWatcher thread on the articles, comments and
+ratings collections. Article changes invalidate just the cache entries they affect
+(models.invalidate_cached_article), and every change is published to the Broadcaster
+that feeds the Server-Sent Events endpoint /api/articles/live.
+
+The stream's resume token is saved to change_stream_tokens, so a restarted worker
+carries on where the stream left off. Each event is also sent with its token as its
+SSE id, so a client that reconnects with Last-Event-ID is replayed what it missed
+from recent history.
+
+Change streams need a replica set. For local development a single node is enough:
+    mongod --replSet rs0 --dbpath <dir>
+    mongosh --eval "rs.initiate()"
+"""
+import collections
+import os
+import queue
+import threading
+import time
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+import json_provider
+import models
+
+WATCHED_COLLECTIONS = ["articles", "comments", "ratings"]
+EVENT_TYPES = {"articles": "article", "comments": "comment", "ratings": "rating"}
+# Changes to these fields move an article between filtered feeds
+FEED_FIELDS = {"genre", "author"}
+# Server error when a resume token is older than the oplog
+CHANGE_STREAM_HISTORY_LOST = 286
+
+
+class LiveEvent:
+    __slots__ = ("id", "type", "genre", "data")
+
+    def __init__(self, event_id, event_type, genre, data):
+        self.id = event_id
+        self.type = event_type
+        self.genre = genre
+        self.data = data
+
+    def matches(self, genre, types):
+        """Whether a subscriber filtering on genre and types should get this event."""
+        if self.type not in types:
+            return False
+        # Events of unknown genre (deletes, comments, ratings) go to everyone
+        return genre is None or self.genre is None or self.genre == genre
+
+    def encode(self):
+        return b"id: %s\nevent: %s\ndata: %s\n\n" % (self.id.encode(), self.type.encode(), self.data)
+
+
+class Subscriber:
+    def __init__(self, queue_size):
+        self.queue = queue.Queue(maxsize=queue_size)
+        # Set when the subscriber falls too far behind; its stream then ends and the client reconnects
+        self.dropped = False
+
+
+class Broadcaster:
+    """Fans events out to subscriber queues and keeps recent events for Last-Event-ID replay."""
+
+    def __init__(self, history_size=1000, queue_size=256):
+        self.queue_size = queue_size
+        self._history = collections.deque(maxlen=history_size)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, last_event_id=None):
+        """Returns (subscriber, backlog): the events after last_event_id if it is still in history."""
+        subscriber = Subscriber(self.queue_size)
+        with self._lock:
+            backlog = []
+            if last_event_id:
+                ids = [event.id for event in self._history]
+                if last_event_id in ids:
+                    backlog = list(self._history)[ids.index(last_event_id) + 1:]
+            self._subscribers.add(subscriber)
+        return subscriber, backlog
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event):
+        with self._lock:
+            self._history.append(event)
+            for subscriber in list(self._subscribers):
+                try:
+                    subscriber.queue.put_nowait(event)
+                except queue.Full:
+                    subscriber.dropped = True
+                    self._subscribers.discard(subscriber)
+
+    def __len__(self):
+        return len(self._subscribers)
+
+
+class ChangeWatcher:
+    """Follows the change stream on a background thread, reconnecting and resuming after errors."""
+
+    def __init__(self, broadcaster, name="api", token_interval=5, retry_delay=5, clock=time.monotonic):
+        self.broadcaster = broadcaster
+        self.name = name
+        self.token_interval = token_interval
+        self.retry_delay = retry_delay
+        self.clock = clock
+        self.events = 0
+        self._stopped = threading.Event()
+        self._token_saved_at = 0
+
+    def start(self):
+        threading.Thread(target=self._run, name="change-watcher", daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def load_token(self):
+        saved = models.db.change_stream_tokens.find_one({"_id": self.name})
+        return saved["token"] if saved else None
+
+    def save_token(self, token):
+        if token is None:
+            return
+        models.db.change_stream_tokens.update_one(
+            {"_id": self.name}, {"$set": {"token": token, "updated_at": time.time()}}, upsert=True)
+        self._token_saved_at = self.clock()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.watch()
+            except OperationFailure as e:
+                if e.code == CHANGE_STREAM_HISTORY_LOST:
+                    # Too far behind to resume: start from now, and anything cached may be stale
+                    print("Change stream history lost; restarting from now")
+                    models.db.change_stream_tokens.delete_one({"_id": self.name})
+                    models.invalidate_article_cache()
+                    continue
+                print("Change stream failed:", e)
+            except PyMongoError as e:
+                print("Change stream failed:", e)
+            self._stopped.wait(self.retry_delay)
+
+    def watch(self):
+        pipeline = [{"$match": {
+            "ns.coll": {"$in": WATCHED_COLLECTIONS},
+            "operationType": {"$in": ["insert", "update", "replace", "delete"]},
+        }}]
+        with models.db.watch(pipeline, full_document="updateLookup", resume_after=self.load_token(),
+                             max_await_time_ms=1000) as stream:
+            while stream.alive and not self._stopped.is_set():
+                change = stream.try_next()
+                if change is not None:
+                    self.handle(change)
+                # Also saved when idle: the token advances past other collections' writes
+                if self.clock() - self._token_saved_at >= self.token_interval:
+                    self.save_token(stream.resume_token)
+            self.save_token(stream.resume_token)
+
+    def handle(self, change):
+        """Invalidate the cache entries a change affects and publish it."""
+        collection = change["ns"]["coll"]
+        operation = change["operationType"]
+        document = change.get("fullDocument") or {}
+
+        if collection == "articles":
+            article_id = str(change["documentKey"]["_id"])
+            genre, source = document.get("genre"), document.get("author")
+            updated = set(change.get("updateDescription", {}).get("updatedFields", {}))
+            removed = set(change.get("updateDescription", {}).get("removedFields", []))
+            if operation in ("delete", "replace") or not document or (updated | removed) & FEED_FIELDS:
+                # The article may have left feeds we can't identify
+                models.invalidate_cached_article(article_id)
+            else:
+                models.invalidate_cached_article(article_id, genre, source)
+
+            payload = {"operation": operation, "article_id": article_id, "genre": genre}
+            if document:
+                payload["article"] = {field: document.get(field) for field in ["_id"] + models.FIELD_PRESETS["card"]}
+        else:
+            genre = None
+            payload = {"operation": operation, "article_id": document.get("article_id"),
+                       "id": str(change["documentKey"]["_id"])}
+
+        self.events += 1
+        self.broadcaster.publish(LiveEvent(
+            change["_id"]["_data"], EVENT_TYPES[collection], genre, json_provider.dumps_bytes(payload)))
+
+
+broadcaster = Broadcaster()
+watcher = None
+_pid = None
+_lock = threading.Lock()
+
+
+def ensure_started():
+    """
+    Give this process its own broadcaster and change-stream watcher, replacing any
+    inherited from a parent across fork. Called by controllers.start_background_tasks.
+    """
+    global broadcaster, watcher, _pid
+    if _pid != os.getpid():
+        with _lock:
+            if _pid != os.getpid():
+                settings = models.config
+                # Fresh state: subscribers inherited across a fork belong to the parent
+                broadcaster = Broadcaster(settings["LIVE_HISTORY_SIZE"])
+                watcher = ChangeWatcher(broadcaster, settings["LIVE_WATCHER_NAME"])
+                watcher.start()
+                _pid = os.getpid()
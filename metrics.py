@@ -0,0 +1,204 @@
+"""
+Prometheus metrics for the API and its Mongo traffic, served at /metrics.
+
+Requests are timed per route, and the Mongo and serialization time spent inside each
+request is recorded per route too, so a slow endpoint can be split into time in Mongo,
+time serializing the response, and everything else (formatting, Python work).
+
+Under gunicorn set PROMETHEUS_MULTIPROC_DIR to an empty directory so /metrics
+aggregates every worker rather than whichever one answers the scrape.
+"""
+import os
+import threading
+import time
+
+from flask import Response, g, request
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY,
+                               generate_latest, multiprocess)
+from pymongo import monitoring
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time spent handling a request", ["method", "route"])
+REQUEST_MONGO_TIME = Histogram(
+    "http_request_mongo_seconds", "Time a request spent waiting on Mongo commands", ["method", "route"])
+REQUEST_SERIALIZATION_TIME = Histogram(
+    "http_request_serialization_seconds", "Time a request spent serializing its JSON body", ["method", "route"])
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "Requests currently being handled", ["method", "route"],
+    multiprocess_mode="livesum")
+REQUESTS_TOTAL = Counter(
+    "http_requests_total", "Requests handled, by response status", ["method", "route", "status"])
+RESPONSE_COMPRESSION_SECONDS = Histogram(
+    "http_response_compression_seconds", "CPU time spent compressing a response body", ["encoding", "source"],
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25))
+RESPONSE_COMPRESSION_RATIO = Histogram(
+    "http_response_compression_ratio", "Compressed size divided by original size", ["encoding", "source"],
+    buckets=(0.05, 0.1, 0.15, 0.2, 0.3, 0.4, 0.5, 0.75, 1.0))
+
+MONGO_COMMAND_DURATION = Histogram(
+    "mongo_command_duration_seconds", "Mongo command round trip time", ["command", "collection"])
+MONGO_COMMAND_FAILURES = Counter(
+    "mongo_command_failures_total", "Mongo commands that failed", ["command", "collection"])
+MONGO_DOCUMENTS_RETURNED = Counter(
+    "mongo_documents_returned_total", "Documents returned by find, getMore and aggregate", ["command", "collection"])
+MONGO_POOL_CHECKOUT_WAIT = Histogram(
+    "mongo_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5))
+MONGO_POOL_CHECKOUT_FAILURES = Counter(
+    "mongo_pool_checkout_failures_total", "Connection checkouts that failed", ["reason"])
+MONGO_POOL_CHECKED_OUT = Gauge(
+    "mongo_pool_connections_checked_out", "Pooled connections currently in use", multiprocess_mode="livesum")
+
+# Mongo time for the request being handled on this thread (sync PyMongo runs listeners on the calling thread)
+_request_state = threading.local()
+
+
+def _collection_name(command_name, command):
+    if command_name == "getMore":
+        return command.get("collection", "")
+    target = command.get(command_name)
+    return target if isinstance(target, str) else ""
+
+
+def _documents_returned(reply):
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", ())))
+    return 0
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """Records each command's duration and document count per collection."""
+
+    def __init__(self):
+        # The succeeded/failed events don't carry the command, so remember each one's collection
+        self._collections = {}
+
+    def started(self, event):
+        self._collections[(event.connection_id, event.request_id)] = _collection_name(event.command_name, event.command)
+
+    def succeeded(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        seconds = event.duration_micros / 1e6
+        MONGO_COMMAND_DURATION.labels(event.command_name, collection).observe(seconds)
+        if event.command_name in ("find", "getMore", "aggregate"):
+            MONGO_DOCUMENTS_RETURNED.labels(event.command_name, collection).inc(_documents_returned(event.reply))
+        _add_request_mongo_time(seconds)
+
+    def failed(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        seconds = event.duration_micros / 1e6
+        MONGO_COMMAND_DURATION.labels(event.command_name, collection).observe(seconds)
+        MONGO_COMMAND_FAILURES.labels(event.command_name, collection).inc()
+        _add_request_mongo_time(seconds)
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Records how long requests wait to check a connection out of the pool."""
+
+    def connection_checked_out(self, event):
+        MONGO_POOL_CHECKOUT_WAIT.observe(event.duration)
+        MONGO_POOL_CHECKED_OUT.inc()
+        _add_request_mongo_time(event.duration)
+
+    def connection_check_out_failed(self, event):
+        MONGO_POOL_CHECKOUT_WAIT.observe(event.duration)
+        MONGO_POOL_CHECKOUT_FAILURES.labels(event.reason).inc()
+
+    def connection_checked_in(self, event):
+        MONGO_POOL_CHECKED_OUT.dec()
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+
+def mongo_listeners():
+    """Listeners to pass as event_listeners when creating a Mongo client."""
+    return [CommandMetrics(), PoolMetrics()]
+
+
+def _add_request_mongo_time(seconds):
+    if getattr(_request_state, "active", False):
+        _request_state.mongo_seconds += seconds
+
+
+def observe_serialization(seconds):
+    """Add time spent serializing a response body to the current request."""
+    if getattr(_request_state, "active", False):
+        _request_state.serialization_seconds += seconds
+
+
+def observe_compression(encoding, source, seconds, ratio):
+    """Record one compression; source is "cache" when the result is stored with a cache entry."""
+    RESPONSE_COMPRESSION_SECONDS.labels(encoding, source).observe(seconds)
+    RESPONSE_COMPRESSION_RATIO.labels(encoding, source).observe(ratio)
+
+
+def _route():
+    # The URL rule, not the path, so label cardinality stays bounded
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+
+def _before_request():
+    g.metrics_labels = (request.method, _route())
+    g.metrics_started = time.perf_counter()
+    REQUESTS_IN_PROGRESS.labels(*g.metrics_labels).inc()
+    _request_state.active = True
+    _request_state.mongo_seconds = 0.0
+    _request_state.serialization_seconds = 0.0
+
+
+def _after_request(response):
+    labels = g.get("metrics_labels")
+    if labels:
+        REQUESTS_TOTAL.labels(*labels, str(response.status_code)).inc()
+    return response
+
+
+def _teardown_request(exc):
+    labels = g.get("metrics_labels")
+    if not labels:
+        return
+    REQUEST_LATENCY.labels(*labels).observe(time.perf_counter() - g.metrics_started)
+    REQUEST_MONGO_TIME.labels(*labels).observe(_request_state.mongo_seconds)
+    REQUEST_SERIALIZATION_TIME.labels(*labels).observe(_request_state.serialization_seconds)
+    REQUESTS_IN_PROGRESS.labels(*labels).dec()
+    _request_state.active = False
+
+
+def metrics_response():
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
+
+
+def init_app(app):
+    """Time every request and serve the metrics at /metrics."""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    app.add_url_rule("/metrics", "metrics", metrics_response)
@@ -0,0 +1,163 @@
+"""
+One-off data migrations. Each one is safe to re-run.
+
+Usage
+python migrations.py backfill-rating-timestamps
+python migrations.py rebuild-rating-summaries
+python migrations.py rename-language-field
+python migrations.py rebuild-comment-counts
+python migrations.py migrate-collections
+"""
+import argparse
+import datetime
+
+from pymongo import ReturnDocument, UpdateOne
+
+import models
+
+
+def backfill_rating_timestamps():
+    """Give ratings saved before timestamps were stored the creation time encoded in their ObjectId."""
+    result = models.db.ratings.update_many(
+        {"timestamp": {"$exists": False}},
+        [{"$set": {"timestamp": {"$toDate": "$_id"}}}]
+    )
+    return result.modified_count
+
+
+def rebuild_rating_summaries(batch_size=500):
+    """
+    Recompute the rating summary of every rated article from the raw ratings.
+
+    Run it once before the incremental summaries go live, or with writes paused:
+    it overwrites the ratings section of article_stats.
+    """
+    summaries = {}
+    for rating in models.db.ratings.find({}, {"article_id": 1, "accuracy": 1, "bias": 1, "insight": 1}):
+        try:
+            increments = models.rating_summary_increments(rating["accuracy"], rating["bias"], rating["insight"])
+        except (KeyError, TypeError):
+            # Skip malformed ratings rather than failing the whole rebuild
+            continue
+
+        # Fold the dotted $inc paths into one nested "ratings" document per article
+        summary = summaries.setdefault(rating["article_id"], {})
+        for path, amount in increments.items():
+            *parents, leaf = path.split(".")[1:]
+            node = summary
+            for part in parents:
+                node = node.setdefault(part, {})
+            node[leaf] = node.get(leaf, 0) + amount
+
+    operations = [
+        UpdateOne({"_id": article_id}, {"$set": {"ratings": summary}}, upsert=True)
+        for article_id, summary in summaries.items()
+    ]
+    for start in range(0, len(operations), batch_size):
+        models.db.article_stats.bulk_write(operations[start:start + batch_size], ordered=False)
+    return len(operations)
+
+
+def rename_language_field():
+    """
+    Move the legacy "o. language" field to o_language on the articles that still have it.
+
+    Articles used to be renamed on every read; after this they are served as stored. The
+    dotted name can't be queried or $rename'd as a path, hence $getField/$setField.
+    """
+    legacy = {"$getField": {"field": "o. language", "input": "$$ROOT"}}
+    result = models.db.articles.update_many(
+        {"$expr": {"$ne": [{"$type": legacy}, "missing"]}},
+        [{"$replaceWith": {"$setField": {
+            "field": "o. language",
+            "input": {"$mergeObjects": ["$$ROOT", {"o_language": legacy}]},
+            "value": "$$REMOVE",
+        }}}]
+    )
+    return result.modified_count
+
+
+def rebuild_comment_counts(batch_size=500):
+    """
+    Recompute every article's comment counter from the comments collection.
+
+    Run it once before the counters go live, or with writes paused: it overwrites
+    comments.count in article_stats.
+    """
+    counts = models.db.comments.aggregate([{"$group": {"_id": "$article_id", "count": {"$sum": 1}}}])
+    operations = [
+        UpdateOne({"_id": row["_id"]}, {"$set": {"comments.count": row["count"]}}, upsert=True)
+        for row in counts if row["_id"] is not None
+    ]
+    for start in range(0, len(operations), batch_size):
+        models.db.article_stats.bulk_write(operations[start:start + batch_size], ordered=False)
+    return len(operations)
+
+
+def migrate_collections(batch_size=100):
+    """
+    Copy the legacy per-user article_collections documents into collection_meta and
+    collection_items.
+
+    Resumable: after each batch of users the last migrated _id is saved in
+    migration_checkpoints, and a re-run continues from there. Every write is an upsert,
+    so re-processing a user after an interruption doesn't duplicate anything. A large
+    collection's items are written batch_size at a time. Legacy arrays have no
+    timestamps, so items get added_at values that keep the array order. The legacy
+    documents are left in place; drop article_collections once verified.
+    """
+    checkpoints = models.db.migration_checkpoints
+    checkpoint = checkpoints.find_one({"_id": "migrate-collections"}) or {}
+    query = {"_id": {"$gt": checkpoint["last_id"]}} if "last_id" in checkpoint else {}
+
+    migrated = 0
+    batch_last_id = None
+    for legacy in models.db.article_collections.find(query).sort("_id", 1):
+        created_at = legacy["_id"].generation_time
+        for position, (name, article_ids) in enumerate((legacy.get("collections") or {}).items()):
+            meta = models.db.collection_meta.find_one_and_update(
+                {"user_id": legacy["user_id"], "name": name},
+                {"$setOnInsert": {"created_at": created_at + datetime.timedelta(milliseconds=position)}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            article_ids = list(dict.fromkeys(article_ids))
+            operations = [
+                UpdateOne(
+                    {"collection_id": meta["_id"], "article_id": article_id},
+                    {"$setOnInsert": {"user_id": legacy["user_id"],
+                                      "added_at": created_at + datetime.timedelta(milliseconds=index)}},
+                    upsert=True
+                )
+                for index, article_id in enumerate(article_ids)
+            ]
+            for start in range(0, len(operations), batch_size):
+                models.db.collection_items.bulk_write(operations[start:start + batch_size], ordered=False)
+            item_count = models.db.collection_items.count_documents({"collection_id": meta["_id"]})
+            models.db.collection_meta.update_one({"_id": meta["_id"]}, {"$set": {"item_count": item_count}})
+
+        migrated += 1
+        batch_last_id = legacy["_id"]
+        if migrated % batch_size == 0:
+            checkpoints.update_one({"_id": "migrate-collections"}, {"$set": {"last_id": batch_last_id}}, upsert=True)
+
+    if batch_last_id is not None:
+        checkpoints.update_one({"_id": "migrate-collections"}, {"$set": {"last_id": batch_last_id}}, upsert=True)
+    return migrated
+
+
+MIGRATIONS = {
+    "backfill-rating-timestamps": backfill_rating_timestamps,
+    "rebuild-rating-summaries": rebuild_rating_summaries,
+    "rename-language-field": rename_language_field,
+    "rebuild-comment-counts": rebuild_comment_counts,
+    "migrate-collections": migrate_collections,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a data migration.")
+    parser.add_argument("migration", choices=sorted(MIGRATIONS))
+    args = parser.parse_args()
+
+    print(f"{args.migration}: {MIGRATIONS[args.migration]()} documents updated")
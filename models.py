@@ -1,56 +1,328 @@
+import base64
 import datetime
 import os
 import re
+import threading
+import time
 from datetime import timezone
 
-import certifi
-from bson import ObjectId
-from flask import Flask
-from pymongo import MongoClient, DESCENDING
+from bson import ObjectId, json_util
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from pymongo import MongoClient, ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
+from pymongo.read_concern import ReadConcern
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
 
-from config import TestingConfig, Config
+from cache import TTLCache
+from config import get_config
 
-app = Flask(__name__)
-app.config.from_object(TestingConfig if os.getenv("FLASK_ENV") == "testing" else Config)
+try:
+    # Optional: converts BSON straight to JSON in C (see fetch_article_json)
+    import bsonjs
+except ImportError:
+    bsonjs = None
 
-mongo_uri = app.config["MONGO_URI"]
 
-client = MongoClient(mongo_uri, tlsCAFile=certifi.where()) if "mongodb+srv" in mongo_uri else MongoClient(mongo_uri)
-db_name = mongo_uri.rsplit("/", 1)[-1]
-db = client[db_name]
-articles_collection = db.articles
+def load_config(config_object=None):
+    """Upper-case settings from a config class (the FLASK_ENV default when none is given)."""
+    config_object = config_object or get_config()
+    return {key: getattr(config_object, key) for key in dir(config_object) if key.isupper()}
 
 
-def format_article_for_output(article):
-    """Helper function to format an article for output."""
-    if not article:
+# Settings used by the models; create_app replaces them with the app's config via configure()
+config = load_config()
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def create_client(settings):
+    """A MongoClient sized from settings. Only call this in the process that will use it."""
+    mongo_uri = settings["MONGO_URI"]
+    if not mongo_uri:
+        raise RuntimeError("MONGO_URI is not configured; set MONGO_PATH (or MONGO_TEST_PATH when testing)")
+
+    options = {
+        "maxPoolSize": settings["MONGO_MAX_POOL_SIZE"],
+        "minPoolSize": settings["MONGO_MIN_POOL_SIZE"],
+        "waitQueueTimeoutMS": settings["MONGO_WAIT_QUEUE_TIMEOUT_MS"],
+    }
+    if "mongodb+srv" in mongo_uri:
+        import certifi
+        options["tlsCAFile"] = certifi.where()
+    if settings["METRICS_ENABLED"]:
+        import metrics
+        options["event_listeners"] = metrics.mongo_listeners()
+    return MongoClient(mongo_uri, **options)
+
+
+def database_name(settings=None):
+    mongo_uri = (settings or config)["MONGO_URI"]
+    return mongo_uri.rsplit("/", 1)[-1].split("?", 1)[0]
+
+
+def get_client():
+    """
+    The MongoClient for this process. It is created on first use, and again in a forked
+    worker, since a MongoClient must not be shared across fork (gunicorn --preload).
+    """
+    global _client, _client_pid
+    if _client_pid != os.getpid():
+        with _client_lock:
+            if _client_pid != os.getpid():
+                _client = create_client(config)
+                _client_pid = os.getpid()
+    return _client
+
+
+def get_db():
+    return get_client()[database_name()]
+
+
+READ_PREFERENCES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+# Collections bound to a READ_ROUTES entry, keyed by (collection name, route)
+_read_collections = {}
+
+
+def read_options(route):
+    """with_options() arguments for a READ_ROUTES entry; also used by async_models."""
+    settings = config["READ_ROUTES"][route]
+    mode = READ_PREFERENCES[settings["preference"]]
+    # max_staleness only applies to modes that may read from a secondary
+    preference = mode() if mode is Primary else mode(max_staleness=settings["max_staleness"])
+    return {"read_preference": preference, "read_concern": ReadConcern(settings["concern"])}
+
+
+def read_collection(name, route):
+    """db[name] with the read preference and read concern configured for route in READ_ROUTES."""
+    client = get_client()
+    collection = _read_collections.get((name, route))
+    # Rebuilt when the client is replaced by configure() or a fork
+    if collection is None or collection.database.client is not client:
+        collection = get_db()[name].with_options(**read_options(route))
+        _read_collections[(name, route)] = collection
+    return collection
+
+
+def _reset_client_after_fork():
+    # The parent may have forked while holding _client_lock mid-connect (an SRV lookup
+    # can take seconds); a child inheriting it locked would block on its first query
+    global _client, _client_pid, _client_lock, _facets_refresh_lock
+    _client = None
+    _client_pid = None
+    _client_lock = threading.Lock()
+    _read_collections.clear()
+    _facets_refresh_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_client_after_fork)
+
+
+class LazyDatabase:
+    """Stands in for the Database so models.db.<collection> keeps working without connecting at import."""
+
+    def __getattr__(self, name):
+        return getattr(get_db(), name)
+
+    def __getitem__(self, name):
+        return get_db()[name]
+
+
+db = LazyDatabase()
+
+# Serialized article responses, shared by the feed and single-article endpoints
+article_cache = TTLCache(
+    max_entries=config["ARTICLE_CACHE_MAX_ENTRIES"],
+    max_bytes=config["ARTICLE_CACHE_MAX_BYTES"],
+    ttl=config["ARTICLE_CACHE_TTL"],
+)
+
+
+def configure(settings):
+    """
+    Apply an app's settings to the models. A client created under the old settings is
+    dropped; the next query connects with the new ones.
+    """
+    global _client, _client_pid
+    config.update({key: value for key, value in settings.items() if key.isupper()})
+
+    article_cache.max_entries = config["ARTICLE_CACHE_MAX_ENTRIES"]
+    article_cache.max_bytes = config["ARTICLE_CACHE_MAX_BYTES"]
+    article_cache.ttl = config["ARTICLE_CACHE_TTL"]
+
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+    _read_collections.clear()
+
+
+# Server error code for a query needing an index that doesn't exist, e.g. $text without a text index
+INDEX_NOT_FOUND = 27
+
+# Feed order; _id breaks ties between articles published at the same instant
+FEED_SORT = [("published", DESCENDING), ("_id", DESCENDING)]
+
+
+def encode_cursor(values):
+    """Encode keyset values into an opaque, URL-safe cursor string."""
+    raw = json_util.dumps(values).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+# Cursor value type for sort keys that may be missing from a document
+OPTIONAL_DATETIME = (datetime.datetime, type(None))
+
+
+def decode_cursor(cursor, types):
+    """
+    Decode a cursor produced by encode_cursor. types maps each key the caller reads to
+    the type(s) its value must have, so a forged cursor can't put query operators (a
+    dict, a Regex) into the filter. Raises ValueError if it is empty or malformed.
+    """
+    if not cursor:
+        raise ValueError("Invalid cursor")
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json_util.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, dict):
+        raise ValueError("Invalid cursor")
+    for key, expected in types.items():
+        if key not in values or not isinstance(values[key], expected) or isinstance(values[key], bool):
+            raise ValueError("Invalid cursor")
+    return values
+
+
+# Named sparse fieldsets; None means every stored field
+FIELD_PRESETS = {
+    "card": ["title", "summary", "source", "genre", "published"],
+    "full": None,
+}
+FIELD_NAME_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def build_projection(fields=None):
+    """
+    Turn a fields= value into a Mongo projection.
+
+    fields may be a preset name from FIELD_PRESETS or a comma-separated list of
+    top-level field names. Returns None when the full document is wanted and raises
+    ValueError for unknown field syntax. _id is always included.
+    """
+    if not fields:
         return None
+    if not isinstance(fields, str):
+        # e.g. a list from a JSON body, which isn't hashable for the preset lookup
+        raise ValueError("Invalid fields")
 
-    # Convert MongoDB ObjectId to string
-    article["_id"] = str(article["_id"])
+    if fields in FIELD_PRESETS:
+        names = FIELD_PRESETS[fields]
+        if names is None:
+            return None
+    else:
+        names = [name.strip() for name in fields.split(",") if name.strip()]
+
+    if not names or not all(FIELD_NAME_PATTERN.match(name) for name in names):
+        raise ValueError("Invalid fields")
+
+    return {name: 1 for name in names}
 
-    # Format the published date for frontend display
+
+def is_valid_fields(fields):
     try:
-        # If the published field is a datetime object
-        if isinstance(article.get("published"), datetime.datetime):
-            article["published"] = article["published"].strftime("%a, %d %b %Y %H:%M:%S GMT")
-    except Exception as e:
-        # Keep original format if error
-        pass
+        build_projection(fields)
+        return True
+    except ValueError:
+        return False
 
-    # Fix the language field name if needed
-    if "o_language" in article:
-        article["o_language"] = article.pop("o_language")
 
-    # Or ensure consistent naming
-    if "o. language" in article:
-        article["o_language"] = article.pop("o. language")
+def article_cache_key(kind, *params, fields=None):
+    """Normalise request parameters so equivalent requests share one cache entry."""
+    projection = build_projection(fields)
+    normalized_fields = tuple(sorted(projection)) if projection else None
+    return (kind,) + tuple(param or None for param in params) + (normalized_fields,)
 
-    return article
 
+def invalidate_article_cache():
+    """Drop all cached article responses. Call this after new stories are ingested."""
+    return article_cache.invalidate()
 
-def fetch_all_articles(genre=None, source=None):
-    """Retrieve all articles from the database, sorted by published date."""
+
+# _id of the article cache's shared generation counter in cache_generations
+ARTICLE_CACHE_GENERATION_ID = "articles"
+# The generation this process's article cache was filled under, and when it was last compared
+_cache_generation = {"value": None, "checked_at": None}
+
+
+def publish_article_cache_invalidation():
+    """
+    Invalidate the article cache in every worker process: bump the shared generation
+    counter, which the others notice within CACHE_GENERATION_CHECK_SECONDS (see
+    sync_article_cache), and drop this process's entries now. Returns the new generation.
+    """
+    counter = db.cache_generations.find_one_and_update(
+        {"_id": ARTICLE_CACHE_GENERATION_ID}, {"$inc": {"generation": 1}},
+        upsert=True, return_document=ReturnDocument.AFTER)
+    invalidate_article_cache()
+    _cache_generation.update(value=counter["generation"], checked_at=time.monotonic())
+    return counter["generation"]
+
+
+def sync_article_cache():
+    """
+    Drop this process's article cache if another worker published an invalidation since
+    it was filled. Called before cache reads; reads the counter at most once every
+    CACHE_GENERATION_CHECK_SECONDS.
+    """
+    checked_at = _cache_generation["checked_at"]
+    now = time.monotonic()
+    if checked_at is not None and now - checked_at < config["CACHE_GENERATION_CHECK_SECONDS"]:
+        return
+    _cache_generation["checked_at"] = now
+
+    try:
+        counter = db.cache_generations.find_one({"_id": ARTICLE_CACHE_GENERATION_ID})
+    except PyMongoError as e:
+        # Entries still expire after ARTICLE_CACHE_TTL
+        print("Error checking the article cache generation:", e)
+        return
+    generation = counter["generation"] if counter else 0
+    if generation != _cache_generation["value"]:
+        invalidate_article_cache()
+        _cache_generation["value"] = generation
+
+
+def invalidate_cached_article(article_id, genre=None, source=None):
+    """
+    Drop the cached responses one changed article can appear in: its own entries and
+    the feeds filtered on its genre and source (or unfiltered). None for genre or source
+    means unknown, e.g. after a delete, and matches every feed.
+    """
+    def affected(key):
+        if key[0] == "article":
+            return key[1] == article_id
+        # Feed keys all start (kind, genre, source, ...); see article_cache_key
+        key_genre, key_source = key[1], key[2]
+        return ((key_genre is None or genre is None or key_genre == genre)
+                and (key_source is None or source is None or key_source == source))
+
+    return article_cache.invalidate(affected)
+
+
+def build_feed_query(genre=None, source=None):
+    """Build the article filter shared by the feed endpoints."""
     query = {}
     if genre:
         query["genre"] = genre
@@ -62,29 +334,114 @@ def fetch_all_articles(genre=None, source=None):
         {"o_language": "en"},
         {"translated": True}
     ]
+    return query
 
-    # Use MongoDB's native sorting on the date field
-    articles_cursor = articles_collection.find(query).sort("published", DESCENDING)
-    articles = list(articles_cursor)
 
-    # Format articles for output
-    for article in articles:
-        format_article_for_output(article)
+def fetch_all_articles(genre=None, source=None, fields=None):
+    """Retrieve all articles from the database, sorted by published date."""
+    query = build_feed_query(genre, source)
 
-    return articles
+    # Same order as the streamed and paginated feeds, served by the feed indexes. Documents
+    # go out as stored: the app's JSON provider encodes ObjectId and datetime values
+    articles = read_collection("articles", "feed")
+    articles_cursor = articles.find(query, build_projection(fields)).sort(FEED_SORT)
+    return list(articles_cursor)
 
 
-def fetch_article_by_id(article_id):
-    """Retrieve a single article by ObjectId."""
+def iter_all_articles(genre=None, source=None, batch_size=None, fields=None):
+    """Yield articles one at a time, newest first, without materialising the feed."""
+    query = build_feed_query(genre, source)
+    batch_size = batch_size or config["STREAM_BATCH_SIZE"]
+
+    articles_cursor = read_collection("articles", "feed").find(query, build_projection(fields)).sort(FEED_SORT)
+    articles_cursor = articles_cursor.batch_size(batch_size)
     try:
-        specfic_article = articles_collection.find_one({"_id": ObjectId(article_id)})
-        specfic_article["_id"] = str(specfic_article["_id"])
+        for article in articles_cursor:
+            yield article
+    finally:
+        # Release the server-side cursor if the client disconnects mid-stream
+        articles_cursor.close()
 
-        return specfic_article
+
+def fetch_article_by_id(article_id, fields=None):
+    """Retrieve a single article by ObjectId."""
+    try:
+        return read_collection("articles", "feed").find_one({"_id": ObjectId(article_id)}, build_projection(fields))
     except:
         return None
 
 
+# Reads that skip building Python objects: documents stay as undecoded BSON bytes
+RAW_BSON_OPTIONS = CodecOptions(document_class=RawBSONDocument)
+WEEKDAY_NAMES = ["Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat"]
+MONTH_NAMES = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+
+def raw_json_enabled():
+    """Whether article reads take the RawBSON path: RAW_BSON_READS is set and bsonjs is installed."""
+    return bool(config["RAW_BSON_READS"]) and bsonjs is not None
+
+
+def http_date_expression(field):
+    """Aggregation expression formatting a date field like the JSON provider's HTTP dates; other values pass through."""
+    return {
+        "$cond": [
+            {"$eq": [{"$type": field}, "date"]},
+            {"$concat": [
+                {"$arrayElemAt": [WEEKDAY_NAMES, {"$subtract": [{"$dayOfWeek": field}, 1]}]},
+                {"$dateToString": {"date": field, "format": ", %d "}},
+                {"$arrayElemAt": [MONTH_NAMES, {"$subtract": [{"$month": field}, 1]}]},
+                {"$dateToString": {"date": field, "format": " %Y %H:%M:%S GMT"}},
+            ]},
+            field,
+        ]
+    }
+
+
+def raw_article_pipeline(match, fields=None, sort=None):
+    """
+    Aggregation returning articles already in their output form, so the server does the
+    _id and published conversions and the BSON can be turned into JSON without decoding.
+    """
+    pipeline = [{"$match": match}]
+    if sort:
+        pipeline.append({"$sort": sort})
+    projection = build_projection(fields)
+    if projection:
+        pipeline.append({"$project": projection})
+    pipeline.append({"$addFields": {"_id": {"$toString": "$_id"}, "published": http_date_expression("$published")}})
+    return pipeline
+
+
+def raw_documents_to_json(documents):
+    """A JSON array of RawBSONDocuments, encoded by bsonjs. Keys keep their stored order."""
+    return b"[" + b",".join(bsonjs.dumps(document.raw).encode("utf-8") for document in documents) + b"]"
+
+
+def fetch_article_json(article_id, fields=None):
+    """
+    fetch_article_by_id as ready-to-send JSON bytes, or None if the article doesn't exist.
+
+    The document is read as RawBSONDocument and converted by bsonjs, so no per-field
+    Python objects are built. Only _id and published are converted, which covers the
+    article schema; any other BSON-specific value would come out as extended JSON.
+    """
+    if not ObjectId.is_valid(article_id):
+        return None
+    articles = read_collection("articles", "feed").with_options(codec_options=RAW_BSON_OPTIONS)
+    pipeline = raw_article_pipeline({"_id": ObjectId(article_id)}, fields)
+    for document in articles.aggregate(pipeline):
+        return bsonjs.dumps(document.raw).encode("utf-8")
+    return None
+
+
+def fetch_all_articles_json(genre=None, source=None, fields=None):
+    """fetch_all_articles as ready-to-send JSON bytes, through the same RawBSON path as fetch_article_json."""
+    articles = read_collection("articles", "feed").with_options(codec_options=RAW_BSON_OPTIONS)
+    pipeline = raw_article_pipeline(build_feed_query(genre, source), fields, sort=dict(FEED_SORT))
+    return raw_documents_to_json(articles.aggregate(pipeline))
+
+
 def post_user_by_info(id, email, name, picture):
     try:
         users_collection = db.users
@@ -97,37 +454,58 @@ def post_user_by_info(id, email, name, picture):
         return None
 
 
-def search_articles(query):
-    """Search articles by matching query against title, summary, and source (Case Insensitive)."""
-    # Escape special regex characters to prevent regex errors
-    escaped_query = re.escape(query)
+def search_articles(query, fields=None, limit=50, cursor=None):
+    """
+    Full-text search over title, summary, source and genre, best matches first.
 
+    Served by the article_search_text index (see indexes.py) and ranked by text score (ties broken by
+    _id). Returns (articles, next_cursor); pass next_cursor back to get the next page.
+    """
     search_filter = {
-        "$or": [
-            {"title": {"$regex": escaped_query, "$options": "i"}},
-            {"summary": {"$regex": escaped_query, "$options": "i"}},
-            {"source": {"$regex": escaped_query, "$options": "i"}},
-            {"genre": {"$regex": escaped_query, "$options": "i"}}
-        ],
+        "$text": {"$search": query},
         # Either o_language must be "en" OR translated must be true
-        "$and": [
-            {
+        "$or": [
+            {"o_language": "en"},
+            {"translated": True}
+        ]
+    }
+
+    pipeline = [
+        {"$match": search_filter},
+        {"$addFields": {"_score": {"$meta": "textScore"}}},
+    ]
+
+    if cursor is not None:
+        last = decode_cursor(cursor, {"score": float, "id": ObjectId})
+        pipeline.append({
+            "$match": {
                 "$or": [
-                    {"o_language": "en"},
-                    {"translated": True}
+                    {"_score": {"$lt": last["score"]}},
+                    {"_score": last["score"], "_id": {"$lt": last["id"]}}
                 ]
             }
-        ]
-    }
+        })
+
+    pipeline += [
+        {"$sort": {"_score": -1, "_id": -1}},
+        {"$limit": limit},
+    ]
 
-    # Use native sorting on the published date field
-    articles_cursor = articles_collection.find(search_filter).sort("published", DESCENDING)
-    articles = list(articles_cursor)
+    projection = build_projection(fields)
+    if projection:
+        pipeline.append({"$project": dict(projection, _score=1)})
 
-    for article in articles:
-        format_article_for_output(article)
+    articles = []
+    last_key = None
+    for article in read_collection("articles", "search").aggregate(pipeline):
+        last_key = {"score": article.pop("_score"), "id": article["_id"]}
+        articles.append(article)
 
-    return articles
+    next_cursor = None
+    if last_key and len(articles) == limit:
+        next_cursor = encode_cursor(last_key)
+
+    return articles, next_cursor
 
 
 def save_comment(article_id, user_id, comment_body):
@@ -141,42 +519,172 @@ def save_comment(article_id, user_id, comment_body):
         }
         result = comments_coll.insert_one(comment)
         comment["_id"] = str(result.inserted_id)
-        return comment
     except Exception as e:
         print("Error saving comment:", e)
         return None
 
+    update_comment_count(article_id, 1)
+    return comment
+
+
+def update_comment_count(article_id, amount):
+    """Atomically move the article's comment counter in article_stats by amount."""
+    try:
+        db.article_stats.update_one({"_id": article_id}, {"$inc": {"comments.count": amount}}, upsert=True)
+        return True
+    except Exception as e:
+        print("Error updating comment count:", e)
+        return False
+
 
-def fetch_comments_by_id(article_id, limit=None):
+def insert_batch(collection, documents):
     """
-    Fetch comments for an article with optional limit parameter.
+    Insert many documents in one unordered insert_many.
+
+    documents is a list of (index, document) pairs, index being the item's position in
+    the client's request. Returns ({index: inserted _id string}, {index: error message}).
     """
-    comments_collection = db.comments
-    # Only apply limit if it's specified
-    if limit:
-        comments_cursor = comments_collection.find({"article_id": article_id}).limit(limit)
-    else:
-        comments_cursor = comments_collection.find({"article_id": article_id})
+    if not documents:
+        return {}, {}
 
+    failed = {}
+    try:
+        collection.insert_many([document for _, document in documents], ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get("writeErrors", []):
+            failed[documents[error["index"]][0]] = error.get("errmsg", "Write failed")
+
+    # insert_many assigns _id to every document before sending, so successes keep theirs
+    inserted = {index: str(document["_id"]) for index, document in documents if index not in failed}
+    return inserted, failed
+
+
+def batch_results(count, inserted, errors, failed):
+    """
+    Per-item results in request order. errors are items rejected as invalid; failed are
+    items the database didn't store, which are flagged server_error so clients can retry them.
+    """
+    results = []
+    for index in range(count):
+        if index in inserted:
+            results.append({"index": index, "ok": True, "_id": inserted[index]})
+        elif index in failed:
+            results.append({"index": index, "ok": False, "error": failed[index], "server_error": True})
+        else:
+            results.append({"index": index, "ok": False, "error": errors.get(index, "Not inserted")})
+    return results
+
+
+def save_comments_batch(items):
+    """Save many comments ({article_id, user_id, comment}) in one round trip. Returns per-item results."""
+    now = datetime.datetime.now(timezone.utc)
+    errors = {}
+    documents = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not all(item.get(key) for key in ("article_id", "user_id", "comment")):
+            errors[index] = "Missing article_id, user_id or comment"
+            continue
+        documents.append((index, {
+            "article_id": item["article_id"],
+            "user_id": item["user_id"],
+            "comment": item["comment"],
+            "timestamp": now
+        }))
+
+    try:
+        inserted, failed = insert_batch(db.comments, documents)
+    except Exception as e:
+        print("Error saving comment batch:", e)
+        inserted, failed = {}, {index: "Server error" for index, _ in documents}
+
+    # One $inc per article for every comment it received in this batch
+    counts = {}
+    for index, comment in documents:
+        if index in inserted:
+            counts[comment["article_id"]] = counts.get(comment["article_id"], 0) + 1
+    if counts:
+        try:
+            db.article_stats.bulk_write([
+                UpdateOne({"_id": article_id}, {"$inc": {"comments.count": count}}, upsert=True)
+                for article_id, count in counts.items()
+            ], ordered=False)
+        except Exception as e:
+            print("Error updating comment counts:", e)
+
+    return batch_results(len(items), inserted, errors, failed)
+
+
+DEFAULT_COMMENT_PAGE_SIZE = 50
+MAX_COMMENT_PAGE_SIZE = 200
+COMMENT_ORDERS = {"newest": DESCENDING, "oldest": ASCENDING}
+
+
+def build_comments_find(article_id, limit=None, order="newest", cursor=None):
+    """The find() arguments for one page of an article's comments: (filter, sort, limit)."""
+    direction = COMMENT_ORDERS[order]
+    limit = min(limit or DEFAULT_COMMENT_PAGE_SIZE, MAX_COMMENT_PAGE_SIZE)
+
+    query = {"article_id": article_id}
+    if cursor is not None:
+        last = decode_cursor(cursor, {"order": str, "timestamp": OPTIONAL_DATETIME, "id": ObjectId})
+        if last["order"] != order:
+            raise ValueError("Invalid cursor")
+        past = "$lt" if direction == DESCENDING else "$gt"
+        query["$or"] = [
+            {"timestamp": {past: last["timestamp"]}},
+            {"timestamp": last["timestamp"], "_id": {past: last["id"]}}
+        ]
+
+    return query, [("timestamp", direction), ("_id", direction)], limit
+
+
+def format_comments_page(comments_cursor, order, limit):
+    """Format a page of raw comments. Returns (comments, next_cursor)."""
     comments = []
+    last_key = None
     for c in comments_cursor:
+        last_key = {"order": order, "timestamp": c.get("timestamp"), "id": c["_id"]}
         c["_id"] = str(c["_id"])
         # Convert datetime to string for JSON serialization
         if isinstance(c.get("timestamp"), datetime.datetime):
             c["timestamp"] = c["timestamp"].isoformat()
         comments.append(c)
-    return comments
+
+    next_cursor = encode_cursor(last_key) if last_key and len(comments) == limit else None
+    return comments, next_cursor
+
+
+def fetch_comments_by_id(article_id, limit=None, order="newest", cursor=None, with_total=False):
+    """
+    Fetch one page of comments for an article, newest or oldest first.
+
+    Pages are keyset-paginated on (timestamp, _id), served by the
+    comments_article_timestamp index. Returns (comments, next_cursor, total);
+    total is None unless with_total is set.
+    """
+    comments_collection = read_collection("comments", "comments")
+    query, sort, limit = build_comments_find(article_id, limit, order, cursor)
+
+    comments, next_cursor = format_comments_page(comments_collection.find(query).sort(sort).limit(limit), order, limit)
+    total = comments_collection.count_documents({"article_id": article_id}) if with_total else None
+    return comments, next_cursor, total
 
 
 def delete_comment_by_id(comment_id):
     comments_coll = db.comments
     try:
-        result = comments_coll.delete_one({"_id": ObjectId(comment_id)})
-        return result.deleted_count == 1
+        # find_one_and_delete tells us which article's counter to decrement
+        deleted = comments_coll.find_one_and_delete({"_id": ObjectId(comment_id)}, {"article_id": 1})
     except Exception as e:
         print("Error deleting comment:", e)
         return False
 
+    if deleted is None:
+        return False
+    if deleted.get("article_id"):
+        update_comment_count(deleted["article_id"], -1)
+    return True
+
 
 def save_rating(article_id, user_id, accuracy, bias, insight):
     ratings_coll = db.ratings
@@ -186,16 +694,175 @@ def save_rating(article_id, user_id, accuracy, bias, insight):
             "user_id": user_id,
             "accuracy": accuracy,
             "bias": bias,
-            "insight": insight
+            "insight": insight,
+            "timestamp": datetime.datetime.now(timezone.utc)
         }
 
         result = ratings_coll.insert_one(rating)
         rating["_id"] = str(result.inserted_id)
-        return rating
     except Exception as e:
         print("Error saving rating.", e)
         return None
 
+    update_rating_summary(article_id, accuracy, bias, insight)
+    return rating
+
+
+RATING_DIMENSIONS = ("accuracy", "bias", "insight")
+# Ratings are scored 0-100 and bucketed into RATING_HISTOGRAM_BUCKETS equal-width bins
+RATING_SCALE_MAX = 100
+RATING_HISTOGRAM_BUCKETS = 10
+
+
+def rating_bucket(value):
+    """Histogram bin for a rating value, clamped to the rating scale."""
+    bucket = int(value * RATING_HISTOGRAM_BUCKETS // RATING_SCALE_MAX)
+    return min(max(bucket, 0), RATING_HISTOGRAM_BUCKETS - 1)
+
+
+def rating_summary_increments(accuracy, bias, insight):
+    """The $inc that folds one rating into its article's summary in article_stats."""
+    increments = {"ratings.count": 1}
+    for dimension, value in zip(RATING_DIMENSIONS, (accuracy, bias, insight)):
+        increments[f"ratings.{dimension}.sum"] = value
+        increments[f"ratings.{dimension}.histogram.{rating_bucket(value)}"] = 1
+    return increments
+
+
+def is_rating_value(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def save_ratings_batch(items):
+    """
+    Save many ratings ({article_id, user_id, accuracy, bias, insight}) in one round trip and
+    fold them into the article summaries with one unordered bulk_write. Returns per-item results.
+    """
+    now = datetime.datetime.now(timezone.utc)
+    errors = {}
+    documents = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not item.get("article_id") or not item.get("user_id"):
+            errors[index] = "Missing article_id or user_id"
+            continue
+        if not all(is_rating_value(item.get(dimension)) for dimension in RATING_DIMENSIONS):
+            errors[index] = "accuracy, bias and insight must be numbers"
+            continue
+        documents.append((index, {
+            "article_id": item["article_id"],
+            "user_id": item["user_id"],
+            "accuracy": item["accuracy"],
+            "bias": item["bias"],
+            "insight": item["insight"],
+            "timestamp": now
+        }))
+
+    try:
+        inserted, failed = insert_batch(db.ratings, documents)
+    except Exception as e:
+        print("Error saving rating batch:", e)
+        inserted, failed = {}, {index: "Server error" for index, _ in documents}
+
+    # One $inc per article, combining every rating it received in this batch
+    increments = {}
+    for index, rating in documents:
+        if index in inserted:
+            summary = increments.setdefault(rating["article_id"], {})
+            for path, amount in rating_summary_increments(rating["accuracy"], rating["bias"], rating["insight"]).items():
+                summary[path] = summary.get(path, 0) + amount
+    if increments:
+        try:
+            db.article_stats.bulk_write([
+                UpdateOne({"_id": article_id}, {"$inc": summary}, upsert=True)
+                for article_id, summary in increments.items()
+            ], ordered=False)
+        except Exception as e:
+            print("Error updating rating summaries:", e)
+
+    return batch_results(len(items), inserted, errors, failed)
+
+
+def update_rating_summary(article_id, accuracy, bias, insight):
+    """Atomically add one rating to the article's summary document."""
+    try:
+        db.article_stats.update_one(
+            {"_id": article_id},
+            {"$inc": rating_summary_increments(accuracy, bias, insight)},
+            upsert=True
+        )
+        return True
+    except Exception as e:
+        print("Error updating rating summary:", e)
+        return False
+
+
+def format_rating_summary(article_id, stats=None):
+    """Turn an article_stats document into counts, sums, means and dense histograms."""
+    ratings = (stats or {}).get("ratings", {})
+    count = ratings.get("count", 0)
+
+    summary = {"article_id": article_id, "count": count}
+    for dimension in RATING_DIMENSIONS:
+        totals = ratings.get(dimension, {})
+        total = totals.get("sum", 0)
+        histogram = totals.get("histogram", {})
+        summary[dimension] = {
+            "sum": total,
+            "mean": total / count if count else None,
+            "histogram": [histogram.get(str(bucket), 0) for bucket in range(RATING_HISTOGRAM_BUCKETS)]
+        }
+    return summary
+
+
+def fetch_rating_summary(article_id):
+    """Read one article's rating summary; a single lookup by _id."""
+    # Left on the primary: it is reloaded right after the user rates
+    return format_rating_summary(article_id, db.article_stats.find_one({"_id": article_id}, {"ratings": 1}))
+
+
+def fetch_rating_summaries(article_ids):
+    """Rating summaries for many articles in one $in query, keyed by article id."""
+    article_ids = list(dict.fromkeys(article_ids))
+    found = {
+        stats["_id"]: stats
+        for stats in read_collection("article_stats", "stats").find({"_id": {"$in": article_ids}}, {"ratings": 1})
+    }
+    return {article_id: format_rating_summary(article_id, found.get(article_id)) for article_id in article_ids}
+
+
+# Only the counters and sums; the histograms aren't needed for card stats
+ARTICLE_STATS_PROJECTION = dict(
+    {"comments.count": 1, "ratings.count": 1},
+    **{f"ratings.{dimension}.sum": 1 for dimension in RATING_DIMENSIONS}
+)
+
+
+def format_article_stats(article_id, stats=None):
+    """Comment count, rating count and mean rating per dimension from an article_stats document."""
+    stats = stats or {}
+    ratings = stats.get("ratings", {})
+    count = ratings.get("count", 0)
+    return {
+        "article_id": article_id,
+        "comments": stats.get("comments", {}).get("count", 0),
+        "ratings": count,
+        "means": {
+            dimension: ratings.get(dimension, {}).get("sum", 0) / count if count else None
+            for dimension in RATING_DIMENSIONS
+        }
+    }
+
+
+def fetch_article_stats(article_ids):
+    """Counters for many articles in one $in query on article_stats' _id, keyed by article id."""
+    article_ids = list(dict.fromkeys(article_ids))
+    found = {
+        stats["_id"]: stats
+        for stats in read_collection("article_stats", "stats").find(
+            {"_id": {"$in": article_ids}}, ARTICLE_STATS_PROJECTION)
+    }
+    return {article_id: format_article_stats(article_id, found.get(article_id)) for article_id in article_ids}
+
 
 def fetch_ratings_by_article_id(article_id):
     ratings_coll = db.ratings
@@ -222,36 +889,33 @@ def fetch_details_by_user_id(user_id):
         return None
 
 
-def create_collection(user_id, collection_name):
-    try:
-        collections = db.article_collections
+def find_collection(user_id, collection_name):
+    """The collection_meta document for one of a user's collections, or None."""
+    return db.collection_meta.find_one({"user_id": user_id, "name": collection_name})
 
-        existing_user = collections.find_one({"user_id": user_id})
 
-        if not existing_user:
-            new_doc = {
-                "user_id": user_id,
-                "collections": {
-                    collection_name: []
-                }
-            }
-            result = collections.insert_one(new_doc)
-            new_doc["_id"] = str(result.inserted_id)
-            return new_doc
+def create_collection(user_id, collection_name):
+    """
+    Create an empty collection. Returns None if the user already has one by that name.
 
-        else:
-            update_result = collections.update_one(
-                {"user_id": user_id},
-                {"$set": {f"collections.{collection_name}": []}}
-            )
-
-            if update_result.modified_count > 0:
-                return {
-                    "user_id": user_id,
-                    "collection_name": collection_name
-                }
-            else:
-                return None
+    Collections are stored normalized: one collection_meta document per collection and
+    one collection_items document per saved article (see indexes.py).
+    """
+    try:
+        result = db.collection_meta.update_one(
+            {"user_id": user_id, "name": collection_name},
+            {"$setOnInsert": {"created_at": datetime.datetime.now(timezone.utc), "item_count": 0}},
+            upsert=True
+        )
+        if result.upserted_id is None:
+            return None
+
+        return {
+            "_id": str(result.upserted_id),
+            "user_id": user_id,
+            "collection_name": collection_name,
+            "collections": {collection_name: []}
+        }
 
     except Exception as e:
         print("Error in create_collection:", e)
@@ -259,22 +923,23 @@ def create_collection(user_id, collection_name):
 
 
 def add_article_to_collection(user_id, collection_name, article_id):
+    """Add an article to a collection; False if the collection doesn't exist or already has it."""
     try:
-        collections = db.article_collections
-
-        result = collections.update_one(
-            {
-                "user_id": user_id,
-                f"collections.{collection_name}": {"$exists": True}
-            },
-            {
-                "$addToSet": {
-                    f"collections.{collection_name}": article_id
-                }
-            }
+        collection = find_collection(user_id, collection_name)
+        if not collection:
+            return False
+
+        # Upsert on (collection_id, article_id) so an article is only ever saved once
+        result = db.collection_items.update_one(
+            {"collection_id": collection["_id"], "article_id": article_id},
+            {"$setOnInsert": {"user_id": user_id, "added_at": datetime.datetime.now(timezone.utc)}},
+            upsert=True
         )
+        if result.upserted_id is None:
+            return False
 
-        return result.modified_count > 0
+        db.collection_meta.update_one({"_id": collection["_id"]}, {"$inc": {"item_count": 1}})
+        return True
     except Exception as e:
         print("Error updating user collection:", e)
         return False
@@ -301,93 +966,345 @@ def fetch_comments_by_user_id(user_id, limit=None):
     return comments
 
 
-def fetch_all_articles_paginated(genre=None, source=None, page=1, limit=20):
-    query = {}
-    if genre:
-        query["genre"] = genre
-    if source:
-        query["author"] = source
+def build_paginated_find(genre=None, source=None, page=1, limit=20, cursor=None, fields=None):
+    """
+    The find() arguments for one feed page: (filter, projection, skip).
 
-    # Either o_language must be "en" OR translated must be true
-    query["$or"] = [
-        {"o_language": "en"},
-        {"translated": True}
+    When a cursor is given the page seeks past the (published, _id) pair it encodes,
+    so the cost stays flat however deep the client scrolls; an empty cursor is the
+    first page in that mode. Otherwise page/limit are used with skip, as before. A
+    sparse fieldset always keeps published, which the cursor needs.
+    """
+    query = build_feed_query(genre, source)
+    projection = build_projection(fields)
+    if projection:
+        projection["published"] = 1
+
+    if cursor:
+        last = decode_cursor(cursor, {"published": OPTIONAL_DATETIME, "id": ObjectId})
+        # Range predicate on (published, _id), served by the feed indexes
+        query["$and"] = [
+            {
+                "$or": [
+                    {"published": {"$lt": last["published"]}},
+                    {"published": last["published"], "_id": {"$lt": last["id"]}}
+                ]
+            }
+        ]
+
+    # Calculate pagination; page is ignored in keyset mode
+    skip = (page - 1) * limit if cursor is None and page > 1 else 0
+    return query, projection, skip
+
+
+def format_feed_page(articles, limit):
+    """A page of raw feed documents and its cursor: (articles, next_cursor); next_cursor is None on the last page."""
+    articles = list(articles)
+
+    next_cursor = None
+    if articles and limit and len(articles) == limit:
+        last = articles[-1]
+        next_cursor = encode_cursor({"published": last.get("published"), "id": last["_id"]})
+
+    return articles, next_cursor
+
+
+def fetch_all_articles_paginated(genre=None, source=None, page=1, limit=20, cursor=None, fields=None):
+    """Fetch one page of articles, newest first. Returns (articles, next_cursor)."""
+    query, projection, skip = build_paginated_find(genre, source, page, limit, cursor, fields)
+    articles = read_collection("articles", "feed")
+    articles_cursor = articles.find(query, projection).sort(FEED_SORT).skip(skip).limit(limit)
+    return format_feed_page(articles_cursor, limit)
+
+
+def build_count_query(genre=None, source=None):
+    """Filter behind the paginated endpoint's total: the feed's own filter, so totals match the pages."""
+    return build_feed_query(genre, source)
+
+
+def count_feed_articles(genre=None, source=None):
+    """The paginated total, from the materialized facets; counted only if they were never computed."""
+    facets = current_article_facets()
+    if facets:
+        return facet_total(facets, genre, source)
+    return read_collection("articles", "feed").count_documents(build_count_query(genre, source))
+
+
+# _id of the materialized facet summary in article_facets
+ARTICLE_FACETS_ID = "articles"
+
+
+def compute_article_facets():
+    """Article counts in total, per genre, per source (author) and per (genre, source), in one $facet aggregation."""
+    def counts(group_id):
+        return [{"$group": {"_id": group_id, "count": {"$sum": 1}}}, {"$sort": {"count": -1, "_id": 1}}]
+
+    pipeline = [
+        {"$match": build_feed_query()},
+        {"$facet": {
+            "total": [{"$count": "count"}],
+            "genres": counts("$genre"),
+            "sources": counts("$author"),
+            "genre_sources": counts({"genre": "$genre", "source": "$author"}),
+        }}
     ]
+    result = next(db.articles.aggregate(pipeline))
+
+    return {
+        "_id": ARTICLE_FACETS_ID,
+        "total": result["total"][0]["count"] if result["total"] else 0,
+        "genres": [{"value": row["_id"], "count": row["count"]} for row in result["genres"]],
+        "sources": [{"value": row["_id"], "count": row["count"]} for row in result["sources"]],
+        "genre_sources": [
+            {"genre": row["_id"].get("genre"), "source": row["_id"].get("source"), "count": row["count"]}
+            for row in result["genre_sources"]
+        ],
+        "computed_at": datetime.datetime.now(timezone.utc),
+    }
 
-    # Calculate pagination
-    skip = (page - 1) * limit
 
-    # Use MongoDB's native sorting and pagination
-    articles_cursor = articles_collection.find(query).sort("published", DESCENDING).skip(skip).limit(limit)
+def refresh_article_facets():
+    """Recompute the facets and store them. Call on a schedule and after ingestion."""
+    facets = compute_article_facets()
+    db.article_facets.replace_one({"_id": ARTICLE_FACETS_ID}, facets, upsert=True)
+    return facets
 
-    # Format the articles for output
-    paginated_articles = []
-    for article in articles_cursor:
-        paginated_articles.append(format_article_for_output(article))
 
-    return paginated_articles
+def fetch_article_facets(primary=False):
+    """
+    The stored facet summary, or None if it was never computed. A single read by _id,
+    routed like other stats unless primary is set.
+    """
+    collection = db.article_facets if primary else read_collection("article_facets", "stats")
+    return collection.find_one({"_id": ARTICLE_FACETS_ID})
 
 
-def fetch_user_collections(user_id):
-    """Fetch all collections for a user."""
+# Held while this process recomputes the facets, so stale reads start one refresh, not one each
+_facets_refresh_lock = threading.Lock()
+
+
+def refresh_article_facets_once():
+    """refresh_article_facets unless this process is already running one. Returns the facets, or None if skipped."""
+    if not _facets_refresh_lock.acquire(blocking=False):
+        return None
     try:
-        collections = db.article_collections
+        return refresh_article_facets()
+    finally:
+        _facets_refresh_lock.release()
 
-        user_collections = collections.find_one({"user_id": user_id})
-        if user_collections:
-            user_collections["_id"] = str(user_collections["_id"])
-            return user_collections
-        else:
+
+def refresh_article_facets_in_background():
+    """Start refresh_article_facets_once on a thread. Returns the thread."""
+    def run():
+        try:
+            refresh_article_facets_once()
+        except Exception as e:
+            print("Error refreshing article facets:", e)
+
+    thread = threading.Thread(target=run, name="facets-refresh", daemon=True)
+    thread.start()
+    return thread
+
+
+def current_article_facets():
+    """
+    The facet summary to serve, or None if it was never computed. A stale copy is
+    checked against the primary, since a secondary may not have the latest refresh
+    yet; if that is stale too it is served while one background refresh runs.
+    """
+    facets = fetch_article_facets()
+    if facets_are_fresh(facets):
+        return facets
+    facets = fetch_article_facets(primary=True) or facets
+    if facets and not facets_are_fresh(facets) and not _facets_refresh_lock.locked():
+        refresh_article_facets_in_background()
+    return facets
+
+
+def facets_are_fresh(facets, max_age=None):
+    """Whether facets were computed within max_age seconds (FACETS_MAX_AGE by default)."""
+    if not facets or not facets.get("computed_at"):
+        return False
+    computed_at = facets["computed_at"]
+    if computed_at.tzinfo is None:
+        computed_at = computed_at.replace(tzinfo=timezone.utc)
+    age = datetime.datetime.now(timezone.utc) - computed_at
+    return age.total_seconds() <= (config["FACETS_MAX_AGE"] if max_age is None else max_age)
+
+
+def facet_total(facets, genre=None, source=None):
+    """Number of feed articles matching genre and source, looked up in a facet summary."""
+    if genre and source:
+        rows = [row for row in facets["genre_sources"] if row["genre"] == genre and row["source"] == source]
+    elif genre:
+        rows = [row for row in facets["genres"] if row["value"] == genre]
+    elif source:
+        rows = [row for row in facets["sources"] if row["value"] == source]
+    else:
+        return facets["total"]
+    return rows[0]["count"] if rows else 0
+
+
+def fetch_collection_article_ids(user_id, limit=None):
+    """
+    {collection name: [article ids in the order they were added]} for every collection
+    of a user, or None if the user has none. limit caps the ids per collection.
+    """
+    metas = list(db.collection_meta.find({"user_id": user_id}, {"name": 1}).sort("created_at", ASCENDING))
+    if not metas:
+        return None
+
+    # Streamed and grouped here: a $group/$push array per collection could pass the 16 MB document limit
+    article_ids = {meta["_id"]: [] for meta in metas}
+    items = db.collection_items.find({"user_id": user_id}, {"_id": 0, "collection_id": 1, "article_id": 1}).sort(
+        [("collection_id", ASCENDING), ("added_at", ASCENDING), ("_id", ASCENDING)])
+    for item in items:
+        ids = article_ids.get(item["collection_id"])
+        if ids is not None and (not limit or len(ids) < limit):
+            ids.append(item["article_id"])
+
+    return {meta["name"]: article_ids[meta["_id"]] for meta in metas}
+
+
+def fetch_user_collections(user_id):
+    """Fetch all collections for a user, each as the list of its article ids."""
+    try:
+        collections = fetch_collection_article_ids(user_id)
+        if collections is None:
             return None
+        return {"user_id": user_id, "collections": collections}
 
     except Exception as e:
         print("Error in fetch_user_collections:", e)
         return None
 
 
-def fetch_collections_with_articles(user_id):
-    """Fetch all collections for a user with article details."""
-    try:
-        collections = db.article_collections
-        articles_coll = db.articles
+DEFAULT_COLLECTION_PAGE_SIZE = 50
+MAX_COLLECTION_PAGE_SIZE = 200
+
+
+def fetch_collection_items(user_id, collection_name, limit=None, cursor=None, fields=None):
+    """
+    One page of a collection, in the order articles were added, each item with its
+    article (None if the article no longer exists).
+
+    Keyset-paginated on (added_at, _id), served by the collection_items_order index.
+    Returns None if the collection doesn't exist, otherwise a dict with the items,
+    the collection's total item count and next_cursor.
+    """
+    collection = find_collection(user_id, collection_name)
+    if not collection:
+        return None
+
+    limit = min(limit or DEFAULT_COLLECTION_PAGE_SIZE, MAX_COLLECTION_PAGE_SIZE)
+    query = {"collection_id": collection["_id"]}
+    if cursor is not None:
+        last = decode_cursor(cursor, {"added_at": datetime.datetime, "id": ObjectId})
+        query["$or"] = [
+            {"added_at": {"$gt": last["added_at"]}},
+            {"added_at": last["added_at"], "_id": {"$gt": last["id"]}}
+        ]
+
+    items = list(db.collection_items.find(query, {"article_id": 1, "added_at": 1})
+                 .sort([("added_at", ASCENDING), ("_id", ASCENDING)]).limit(limit))
+
+    next_cursor = None
+    if len(items) == limit:
+        next_cursor = encode_cursor({"added_at": items[-1]["added_at"], "id": items[-1]["_id"]})
+
+    articles_by_id, _ = fetch_articles_by_ids([item["article_id"] for item in items], fields)
+    return {
+        "user_id": user_id,
+        "collection_name": collection_name,
+        "total": collection.get("item_count", 0),
+        "items": [
+            {"article_id": item["article_id"], "added_at": item["added_at"],
+             "article": articles_by_id.get(item["article_id"])}
+            for item in items
+        ],
+        "next_cursor": next_cursor
+    }
+
+
+# Upper bound on ids per $in query when resolving article ids in bulk
+ARTICLE_ID_BATCH_SIZE = 1000
+
+
+def fetch_articles_by_ids(article_ids, fields=None):
+    """
+    Fetch many articles with batched $in queries instead of one find_one per id.
+
+    Returns (articles_by_id, invalid_ids): a dict from id string to article
+    for the ids that exist, and the ids that are not valid ObjectIds.
+    """
+    projection = build_projection(fields)
+
+    object_ids = []
+    invalid_ids = []
+    for article_id in dict.fromkeys(article_ids):
+        if ObjectId.is_valid(article_id):
+            object_ids.append(ObjectId(article_id))
+        else:
+            invalid_ids.append(article_id)
 
-        user_collections = collections.find_one({"user_id": user_id})
+    articles_by_id = {}
+    for start in range(0, len(object_ids), ARTICLE_ID_BATCH_SIZE):
+        batch = object_ids[start:start + ARTICLE_ID_BATCH_SIZE]
+        for article in read_collection("articles", "feed").find({"_id": {"$in": batch}}, projection):
+            articles_by_id[str(article["_id"])] = article
 
-        if not user_collections:
+    return articles_by_id, invalid_ids
+
+
+def fetch_articles_in_order(article_ids, fields=None):
+    """
+    Multi-get for the batch endpoint: (articles, invalid_ids, missing_ids), with articles
+    in the order their ids were requested (duplicates dropped) and missing_ids the valid
+    ids that match no article.
+    """
+    article_ids = list(dict.fromkeys(article_ids))
+    articles_by_id, invalid_ids = fetch_articles_by_ids(article_ids, fields)
+    invalid = set(invalid_ids)
+
+    articles = [articles_by_id[article_id] for article_id in article_ids if article_id in articles_by_id]
+    missing_ids = [
+        article_id for article_id in article_ids
+        if article_id not in articles_by_id and article_id not in invalid
+    ]
+    return articles, invalid_ids, missing_ids
+
+
+def fetch_collections_with_articles(user_id, fields=None, limit=None):
+    """
+    Fetch all collections for a user with article details.
+
+    Article ids from every collection are resolved together in one batched lookup and
+    each collection keeps its original order. limit caps the articles returned per
+    collection. Ids that are invalid or no longer exist are listed under "missing".
+    """
+    try:
+        requested = fetch_collection_article_ids(user_id, limit)
+
+        if requested is None:
             return None
 
-        # Convert _id to string for JSON serialization
-        user_collections["_id"] = str(user_collections["_id"])
+        all_ids = [article_id for article_ids in requested.values() for article_id in article_ids]
+        articles_by_id, _ = fetch_articles_by_ids(all_ids, fields)
 
-        # For each collection, fetch the article details
         result_collections = {}
-
-        for collection_name, article_ids in user_collections["collections"].items():
-            # Skip empty collections
-            if not article_ids:
-                result_collections[collection_name] = []
-                continue
-
-            articles = []
-            for article_id in article_ids:
-                try:
-                    # Try to convert the article_id string to ObjectId and fetch the article
-                    article = articles_coll.find_one({"_id": ObjectId(article_id)})
-                    if article:
-                        # Format article for output
-                        article = format_article_for_output(article)
-                        articles.append(article)
-                except Exception as e:
-                    # Skip any articles that can't be found or have invalid IDs
-                    print(f"Error fetching article {article_id}: {e}")
-                    continue
-
-            result_collections[collection_name] = articles
+        missing = {}
+        for collection_name, article_ids in requested.items():
+            result_collections[collection_name] = [
+                articles_by_id[article_id] for article_id in article_ids if article_id in articles_by_id
+            ]
+            missing_ids = [article_id for article_id in article_ids if article_id not in articles_by_id]
+            if missing_ids:
+                missing[collection_name] = missing_ids
 
         return {
-            "_id": user_collections["_id"],
             "user_id": user_id,
-            "collections": result_collections
+            "collections": result_collections,
+            "missing": missing
         }
 
     except Exception as e:
@@ -397,49 +1314,59 @@ def fetch_collections_with_articles(user_id):
 
 def fetch_ratings_by_user_id(user_id, limit=None):
     """
-    Fetch ratings by a user with optional limit parameter.
+    Fetch ratings by a user, newest first, each with the title of the rated article.
+
+    Runs as a single aggregation: the sort and limit use the (user_id, timestamp) index
+    and the titles are joined in with $lookup, so the cost is one round trip.
     """
     ratings_collection = db.ratings
-    try:
-        # Find ratings by user_id with optional limit
-        if limit:
-            ratings_cursor = ratings_collection.find({"user_id": user_id}).limit(limit)
-        else:
-            ratings_cursor = ratings_collection.find({"user_id": user_id})
-
-        ratings_with_details = []
+    pipeline = [
+        {"$match": {"user_id": user_id}},
+        {"$sort": {"timestamp": DESCENDING, "_id": DESCENDING}},
+    ]
+    # Only apply limit if it's specified
+    if limit:
+        pipeline.append({"$limit": limit})
 
-        for rating in ratings_cursor:
-            # Convert ObjectId to string
-            rating["_id"] = str(rating["_id"])
-
-            # Get the article details for each rating
-            try:
-                article = articles_collection.find_one({"_id": ObjectId(rating["article_id"])})
-                if article:
-                    # Add article title to the rating object
-                    rating["articleTitle"] = article.get("title", "Unknown Article")
-                    # Add timestamp if it doesn't exist
-                    if "timestamp" not in rating:
-                        rating["timestamp"] = datetime.datetime.now(timezone.utc)
-                else:
-                    rating["articleTitle"] = "Article Not Found"
-            except Exception as article_err:
-                print(f"Error fetching article for rating: {article_err}")
-                rating["articleTitle"] = "Error Loading Article"
+    pipeline += [
+        {
+            "$lookup": {
+                "from": "articles",
+                "let": {
+                    "article_id": {"$convert": {"input": "$article_id", "to": "objectId", "onError": None, "onNull": None}}
+                },
+                "pipeline": [
+                    {"$match": {"$expr": {"$eq": ["$_id", "$$article_id"]}}},
+                    {"$project": {"_id": 0, "title": 1}}
+                ],
+                "as": "article"
+            }
+        },
+        {
+            "$set": {
+                "_id": {"$toString": "$_id"},
+                # Ratings saved before timestamps were stored fall back to their creation time
+                "timestamp": {"$ifNull": ["$timestamp", {"$toDate": "$_id"}]},
+                "articleTitle": {
+                    "$cond": [
+                        {"$eq": [{"$size": "$article"}, 0]},
+                        "Article Not Found",
+                        {"$ifNull": [{"$arrayElemAt": ["$article.title", 0]}, "Unknown Article"]}
+                    ]
+                }
+            }
+        },
+        {"$unset": "article"},
+    ]
 
+    try:
+        ratings_with_details = []
+        for rating in ratings_collection.aggregate(pipeline):
             # Convert datetime to string for JSON serialization
             if isinstance(rating.get("timestamp"), datetime.datetime):
                 rating["timestamp"] = rating["timestamp"].isoformat()
-
             ratings_with_details.append(rating)
 
-        # Sort by timestamp (newest first)
-        ratings_with_details.sort(
-            key=lambda x: x.get("timestamp", ""),
-            reverse=True
-        )
-
         return ratings_with_details
     except Exception as e:
         print("Error fetching user ratings:", e)
@@ -447,32 +1374,35 @@ def fetch_ratings_by_user_id(user_id, limit=None):
 
 
 def delete_collection(user_id, collection_name):
-    result = db.article_collections.update_one(
-        {"user_id": user_id},
-        {"$unset": {f"collections.{collection_name}": ""}}
-    )
-    return result.modified_count > 0
+    collection = db.collection_meta.find_one_and_delete({"user_id": user_id, "name": collection_name}, {"_id": 1})
+    if not collection:
+        return False
+    db.collection_items.delete_many({"collection_id": collection["_id"]})
+    return True
 
 
 def remove_article_from_collection(user_id, collection_name, article_id):
-    result = db.article_collections.update_one(
-        {"user_id": user_id},
-        {"$pull": {f"collections.{collection_name}": article_id}}
-    )
-    return result.modified_count > 0
+    collection = find_collection(user_id, collection_name)
+    if not collection:
+        return False
+
+    result = db.collection_items.delete_one({"collection_id": collection["_id"], "article_id": article_id})
+    if result.deleted_count == 0:
+        return False
+    db.collection_meta.update_one({"_id": collection["_id"]}, {"$inc": {"item_count": -1}})
+    return True
 
 
 def rename_collection(user_id, old_name, new_name):
-    user = db.article_collections.find_one({"user_id": user_id})
-    if not user or old_name not in user["collections"]:
+    """Rename a collection: one update to its metadata, however many articles it holds."""
+    if old_name == new_name:
+        # Nothing to change; succeeds as long as the collection exists
+        return find_collection(user_id, old_name) is not None
+    if find_collection(user_id, new_name):
+        return False
+    try:
+        update = db.collection_meta.update_one({"user_id": user_id, "name": old_name}, {"$set": {"name": new_name}})
+    except DuplicateKeyError:
+        # Another request created new_name in the meantime
         return False
-
-    articles = user["collections"][old_name]
-    update = db.article_collections.update_one(
-        {"user_id": user_id},
-        {
-            "$set": {f"collections.{new_name}": articles},
-            "$unset": {f"collections.{old_name}": ""}
-        }
-    )
     return update.modified_count > 0
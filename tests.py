@@ -1,4 +1,7 @@
+import datetime
+import json
 import os
+import time
 
 os.environ["FLASK_ENV"] = "testing"
 
@@ -120,6 +123,10 @@ def test_post_new_rating(client):
     assert new_rating_data['bias'] == rating_test['bias']
     assert new_rating_data['insight'] == rating_test['insight']
 
+    for bad_value in ("80", True):
+        rejected = client.post("/api/ratings/test_rating_article_id", json=dict(rating_test, accuracy=bad_value))
+        assert rejected.status_code == 400
+
 
 def test_get_ratings_by_article_id(client):
     response = client.get("/api/ratings/test_get_ratings_articleID")
@@ -145,12 +152,16 @@ def test_get_details_by_user_id(client):
 from models import db
 
 
+def clear_collections(user_id):
+    db.collection_meta.delete_many({"user_id": user_id})
+    db.collection_items.delete_many({"user_id": user_id})
+
+
 def test_create_collection_for_new_user(client):
-    collections = db.article_collections
     test_user_id = "new_test_user_001"
     collection_name = "Brand New Collection"
 
-    collections.delete_one({"user_id": test_user_id})
+    clear_collections(test_user_id)
 
     response = client.post("/api/collections/create-new", json={
         "user_id": test_user_id,
@@ -165,24 +176,25 @@ def test_create_collection_for_new_user(client):
     assert collection_doc["user_id"] == test_user_id
     assert collection_doc["collections"][collection_name] == []
 
-    in_db = collections.find_one({"user_id": test_user_id})
-    assert in_db["collections"].get(collection_name) == []
-    collections.delete_one({"user_id": test_user_id})
+    in_db = db.collection_meta.find_one({"user_id": test_user_id, "name": collection_name})
+    assert in_db["item_count"] == 0
+
+    duplicate = client.post("/api/collections/create-new", json={
+        "user_id": test_user_id,
+        "collection_name": collection_name
+    })
+    assert duplicate.status_code == 500
+    clear_collections(test_user_id)
 
 
 def test_add_collection_to_existing_user(client):
-    collections = db.article_collections
+    import models
     test_user_id = "existing_test_user_002"
     first_collection = "Already Exists"
     second_collection = "Add This One"
 
-    collections.delete_one({"user_id": test_user_id})
-    collections.insert_one({
-        "user_id": test_user_id,
-        "collections": {
-            first_collection: []
-        }
-    })
+    clear_collections(test_user_id)
+    models.create_collection(test_user_id, first_collection)
 
     response = client.post("/api/collections/create-new", json={
         "user_id": test_user_id,
@@ -194,27 +206,20 @@ def test_add_collection_to_existing_user(client):
     print(data)
     assert data["added_collection"]["collection_name"] == second_collection
 
-    user_doc = collections.find_one({"user_id": test_user_id})
-    assert first_collection in user_doc["collections"]
-    assert second_collection in user_doc["collections"]
+    collections = client.get(f"/api/collections/{test_user_id}").get_json()["collections"]
+    assert collections == {first_collection: [], second_collection: []}
 
-    collections.delete_one({"user_id": test_user_id})
+    clear_collections(test_user_id)
 
 
 def test_add_article_to_user_collection(client):
-    collections = db.article_collections
+    import models
     test_user_id = "article_add_user"
     collection_name = "Test Collection"
     article_id = "article_123"
 
-    collections.delete_one({"user_id": test_user_id})
-
-    collections.insert_one({
-        "user_id": test_user_id,
-        "collections": {
-            collection_name: []
-        }
-    })
+    clear_collections(test_user_id)
+    models.create_collection(test_user_id, collection_name)
 
     response = client.post("/api/collections/add-article/", json={
         "user_id": test_user_id,
@@ -226,36 +231,44 @@ def test_add_article_to_user_collection(client):
     data = response.get_json()
     assert data["message"] == "Article added to collection"
 
-    doc = collections.find_one({"user_id": test_user_id})
-    assert collection_name in doc["collections"]
-    assert article_id in doc["collections"][collection_name]
+    again = client.post("/api/collections/add-article/", json={
+        "user_id": test_user_id,
+        "collection_name": collection_name,
+        "article_id": article_id
+    })
+    assert again.status_code == 404
+
+    assert models.fetch_user_collections(test_user_id)["collections"][collection_name] == [article_id]
+    assert models.find_collection(test_user_id, collection_name)["item_count"] == 1
 
-    collections.delete_one({"user_id": test_user_id})
+    clear_collections(test_user_id)
 
 
 def test_delete_user_collection(client):
-    collections = db.article_collections
+    import models
     user_id = "delete_test_user"
     collection_name = "Trash"
 
-    collections.insert_one({"user_id": user_id, "collections": {collection_name: []}})
+    clear_collections(user_id)
+    models.create_collection(user_id, collection_name)
+    models.add_article_to_collection(user_id, collection_name, "trashed_article")
     response = client.delete("/api/collections/delete", json={"user_id": user_id, "collection_name": collection_name})
 
     assert response.status_code == 200
-    doc = collections.find_one({"user_id": user_id})
-    assert collection_name not in doc["collections"]
-    collections.delete_one({"user_id": user_id})
+    assert models.find_collection(user_id, collection_name) is None
+    assert db.collection_items.count_documents({"user_id": user_id}) == 0
+    clear_collections(user_id)
 
 
 def test_remove_article_from_collection(client):
+    import models
     user_id = "remove_article_user"
     collection_name = "Reading"
     article_id = "article_to_remove"
 
-    db.article_collections.insert_one({
-        "user_id": user_id,
-        "collections": {collection_name: [article_id]}
-    })
+    clear_collections(user_id)
+    models.create_collection(user_id, collection_name)
+    models.add_article_to_collection(user_id, collection_name, article_id)
 
     response = client.post("/api/collections/remove-article", json={
         "user_id": user_id,
@@ -264,20 +277,20 @@ def test_remove_article_from_collection(client):
     })
 
     assert response.status_code == 200
-    doc = db.article_collections.find_one({"user_id": user_id})
-    assert article_id not in doc["collections"][collection_name]
-    db.article_collections.delete_one({"user_id": user_id})
+    assert models.fetch_user_collections(user_id)["collections"][collection_name] == []
+    assert models.find_collection(user_id, collection_name)["item_count"] == 0
+    clear_collections(user_id)
 
 
 def test_rename_collection(client):
+    import models
     user_id = "rename_user"
     old_name = "Old Name"
     new_name = "New Name"
 
-    db.article_collections.insert_one({
-        "user_id": user_id,
-        "collections": {old_name: ["abc"]}
-    })
+    clear_collections(user_id)
+    models.create_collection(user_id, old_name)
+    models.add_article_to_collection(user_id, old_name, "abc")
 
     response = client.patch("/api/collections/rename", json={
         "user_id": user_id,
@@ -286,7 +299,852 @@ def test_rename_collection(client):
     })
 
     assert response.status_code == 200
-    doc = db.article_collections.find_one({"user_id": user_id})
-    assert new_name in doc["collections"]
-    assert old_name not in doc["collections"]
-    db.article_collections.delete_one({"user_id": user_id})
+    collections = models.fetch_user_collections(user_id)["collections"]
+    assert collections == {new_name: ["abc"]}
+    same = client.patch("/api/collections/rename", json={"user_id": user_id, "old_name": new_name, "new_name": new_name})
+    assert same.status_code == 200
+
+    models.create_collection(user_id, old_name)
+    taken = client.patch("/api/collections/rename", json={"user_id": user_id, "old_name": old_name, "new_name": new_name})
+    assert taken.status_code == 404
+    clear_collections(user_id)
+
+
+def test_collection_items_paginated(client):
+    import models
+    user_id = "collection_items_user"
+    genre = "collection_items_genre"
+    clear_collections(user_id)
+    article_ids = [str(article_id) for article_id in db.articles.insert_many([
+        {"title": f"Saved {i}", "genre": genre, "o_language": "en"} for i in range(5)
+    ]).inserted_ids]
+
+    models.create_collection(user_id, "Reading")
+    for article_id in article_ids:
+        models.add_article_to_collection(user_id, "Reading", article_id)
+
+    seen = []
+    cursor = None
+    while True:
+        url = f"/api/collections/{user_id}/items?collection=Reading&limit=2&fields=card"
+        page = client.get(url + (f"&cursor={cursor}" if cursor else "")).get_json()
+        assert page["total"] == 5
+        seen += [item["article"]["title"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+
+    assert seen == [f"Saved {i}" for i in range(5)]
+    assert client.get(f"/api/collections/{user_id}/items?collection=Nope").status_code == 404
+
+    clear_collections(user_id)
+    db.articles.delete_many({"genre": genre})
+
+
+def test_migrate_collections_is_resumable():
+    import migrations
+    user_id = "migrate_collections_user"
+    clear_collections(user_id)
+    db.article_collections.delete_many({"user_id": user_id})
+    db.migration_checkpoints.delete_many({"_id": "migrate-collections"})
+
+    legacy_id = db.article_collections.insert_one({
+        "user_id": user_id,
+        "collections": {"Later": ["b", "a", "b"], "Empty": []}
+    }).inserted_id
+
+    try:
+        assert migrations.migrate_collections() >= 1
+        import models
+        assert models.fetch_user_collections(user_id)["collections"] == {"Later": ["b", "a"], "Empty": []}
+
+        # A re-run resumes after the checkpoint and a forced redo doesn't duplicate items
+        assert db.migration_checkpoints.find_one({"_id": "migrate-collections"})["last_id"] >= legacy_id
+        db.migration_checkpoints.delete_many({"_id": "migrate-collections"})
+        migrations.migrate_collections()
+        assert models.find_collection(user_id, "Later")["item_count"] == 2
+    finally:
+        clear_collections(user_id)
+        db.article_collections.delete_many({"user_id": user_id})
+        db.migration_checkpoints.delete_many({"_id": "migrate-collections"})
+
+
+def test_get_articles_paginated_with_cursor(client):
+    genre = "cursor_test_genre"
+    published = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+    db.articles.delete_many({"genre": genre})
+    # Two articles share a timestamp so the _id tie-breaker is exercised
+    inserted = db.articles.insert_many([
+        {"title": f"Cursor article {i}", "genre": genre, "o_language": "en",
+         "published": published - datetime.timedelta(hours=i // 2)}
+        for i in range(5)
+    ]).inserted_ids
+
+    seen = []
+    cursor = ""
+    while cursor is not None:
+        response = client.get(f"/api/articles/paginated?genre={genre}&limit=2&cursor={cursor}")
+        assert response.status_code == 200
+        body = response.get_json()
+        assert "total" not in body
+        seen.extend(article["_id"] for article in body["data"])
+        cursor = body["next_cursor"]
+
+    assert len(seen) == 5
+    assert set(seen) == {str(_id) for _id in inserted}
+
+    bad_cursor = client.get("/api/articles/paginated?cursor=not-a-cursor")
+    assert bad_cursor.status_code == 400
+    # Values that decode to query operators are refused, not put in the filter
+    import base64
+    from bson import json_util
+    forged = base64.urlsafe_b64encode(json_util.dumps(
+        {"published": {"$exists": True}, "id": {"$gt": ""}}).encode()).decode()
+    assert client.get(f"/api/articles/paginated?cursor={forged}").status_code == 400
+    assert client.get("/api/articles/search?q=news&cursor=").status_code == 400
+
+    # limit=0 must not turn into Mongo's "no limit"
+    zero = client.get(f"/api/articles/paginated?genre={genre}&limit=0&cursor=").get_json()
+    assert zero["limit"] == 1 and zero["count"] == 1
+    page = client.get(f"/api/articles/paginated?genre={genre}&limit=-5").get_json()
+    assert page["limit"] == 1 and page["pages"] == 5
+
+    db.articles.delete_many({"genre": genre})
+
+
+def test_stream_all_articles_as_ndjson(client):
+    response = client.get("/api/articles?stream=1&batch_size=5")
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+
+    lines = [line for line in response.get_data(as_text=True).splitlines() if line]
+    streamed = [json.loads(line) for line in lines]
+    assert len(streamed) == len(client.get("/api/articles").json)
+
+    via_header = client.get("/api/articles", headers={"Accept": "application/x-ndjson"})
+    assert via_header.mimetype == "application/x-ndjson"
+
+
+def test_get_articles_with_card_fields(client):
+    response = client.get("/api/articles/paginated?fields=card&limit=5")
+    assert response.status_code == 200
+
+    card_fields = {"_id", "title", "summary", "source", "genre", "published"}
+    for article in response.get_json()["data"]:
+        assert set(article.keys()) <= card_fields
+
+    invalid = client.get("/api/articles?fields=title,$where")
+    assert invalid.status_code == 400
+
+
+def test_search_without_text_index_is_unavailable(client, monkeypatch):
+    import models
+    from pymongo.errors import OperationFailure
+
+    def search_without_index(*args):
+        raise OperationFailure("text index required for $text query", code=models.INDEX_NOT_FOUND)
+
+    monkeypatch.setattr(models, "search_articles", search_without_index)
+    response = client.get("/api/articles/search?q=news")
+    assert response.status_code == 503
+    assert response.get_json()["error"] == "Search index unavailable"
+
+
+def test_search_articles_ranked_with_cursor(client):
+    import indexes
+    indexes.ensure_indexes()
+
+    genre = "search_test_genre"
+    db.articles.delete_many({"genre": genre})
+    db.articles.insert_many([
+        {"title": "Nothing to see", "summary": "A zyxwvutsonic mention", "genre": genre, "o_language": "en"},
+        {"title": "Zyxwvutsonic headline", "summary": "Zyxwvutsonic again", "genre": genre, "o_language": "en"},
+        {"title": "Zyxwvutsonic untranslated", "genre": genre, "o_language": "fr", "translated": False},
+    ])
+
+    first = client.get("/api/articles/search?q=zyxwvutsonic&limit=1")
+    assert first.status_code == 200
+    assert [a["title"] for a in first.get_json()] == ["Zyxwvutsonic headline"]
+
+    second = client.get(f"/api/articles/search?q=zyxwvutsonic&limit=1&cursor={first.headers['X-Next-Cursor']}")
+    assert [a["title"] for a in second.get_json()] == ["Nothing to see"]
+
+    db.articles.delete_many({"genre": genre})
+
+
+def test_ttl_cache_eviction_and_expiry():
+    from cache import TTLCache
+
+    now = [0.0]
+    cache = TTLCache(max_entries=2, max_bytes=10, ttl=5, clock=lambda: now[0])
+
+    cache.set("a", b"1234")
+    cache.set("b", b"1234")
+    assert cache.get("a") == b"1234"
+    cache.set("c", b"1234")
+    # "b" was least recently used
+    assert cache.get("b") is None
+    assert cache.get("c") == b"1234"
+
+    now[0] = 6.0
+    assert cache.get("a") is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 2
+    assert stats["evictions"] == 1
+
+
+def test_article_cache_hits_and_invalidation(client):
+    import models
+    models.invalidate_article_cache()
+
+    before = models.article_cache.stats()["hits"]
+    first = client.get("/api/articles/paginated?limit=3")
+    second = client.get("/api/articles/paginated?limit=3")
+    assert first.get_data() == second.get_data()
+    assert models.article_cache.stats()["hits"] == before + 1
+
+    forbidden = client.post("/api/cache/invalidate", headers={"X-Cache-Token": "wrong"})
+    assert forbidden.status_code == 403
+
+    assert models.invalidate_article_cache() >= 1
+    assert len(models.article_cache) == 0
+
+
+def test_cache_invalidation_reaches_other_workers(client):
+    import models
+
+    models._cache_generation["checked_at"] = None
+    models.sync_article_cache()
+    models.article_cache.set(("feed", None, None, None), b"cached")
+    # Another worker handled POST /api/cache/invalidate
+    db.cache_generations.update_one({"_id": models.ARTICLE_CACHE_GENERATION_ID},
+                                    {"$inc": {"generation": 1}}, upsert=True)
+
+    models.sync_article_cache()
+    # Not compared again until CACHE_GENERATION_CHECK_SECONDS have passed
+    assert models.article_cache.get(("feed", None, None, None)) == b"cached"
+
+    models._cache_generation["checked_at"] = None
+    models.sync_article_cache()
+    assert models.article_cache.get(("feed", None, None, None)) is None
+
+
+def test_collections_with_articles_batched_lookup(client):
+    import models
+    user_id = "with_articles_user"
+    genre = "with_articles_genre"
+    clear_collections(user_id)
+    first, second = db.articles.insert_many([
+        {"title": "First", "genre": genre, "o_language": "en"},
+        {"title": "Second", "genre": genre, "o_language": "en"},
+    ]).inserted_ids
+    gone = "0123456789abcdef01234567"
+
+    models.create_collection(user_id, "Reading")
+    models.create_collection(user_id, "Empty")
+    for article_id in [str(second), gone, str(first), "not-an-id"]:
+        models.add_article_to_collection(user_id, "Reading", article_id)
+
+    response = client.get(f"/api/collections/{user_id}/with-articles")
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [a["title"] for a in data["collections"]["Reading"]] == ["Second", "First"]
+    assert data["collections"]["Empty"] == []
+    assert data["missing"] == {"Reading": [gone, "not-an-id"]}
+
+    limited = client.get(f"/api/collections/{user_id}/with-articles?limit=1").get_json()
+    assert [a["title"] for a in limited["collections"]["Reading"]] == ["Second"]
+
+    clear_collections(user_id)
+    db.articles.delete_many({"genre": genre})
+
+
+def test_get_ratings_by_user_id_sorted_with_titles(client):
+    user_id = "ratings_order_user"
+    genre = "ratings_order_genre"
+    db.ratings.delete_many({"user_id": user_id})
+    article_id = db.articles.insert_one({"title": "Rated article", "genre": genre}).inserted_id
+
+    for article in [str(article_id), "0123456789abcdef01234567", str(article_id)]:
+        response = client.post(f"/api/ratings/{article}", json={
+            "user_id": user_id, "accuracy": 1, "bias": 2, "insight": 3
+        })
+        assert response.status_code == 201
+
+    response = client.get(f"/api/user/{user_id}/ratings?limit=2")
+    assert response.status_code == 200
+    data = response.get_json()["data"]
+    assert len(data) == 2
+    assert data[0]["timestamp"] >= data[1]["timestamp"]
+    assert data[0]["articleTitle"] == "Rated article"
+    assert data[1]["articleTitle"] == "Article Not Found"
+    assert client.get(f"/api/user/{user_id}/ratings?limit=0").status_code == 400
+
+    db.ratings.delete_many({"user_id": user_id})
+    db.articles.delete_many({"genre": genre})
+
+
+def test_rating_summary_is_maintained_on_save(client):
+    article_id = "rating_summary_article"
+    other_id = "rating_summary_unrated"
+    db.ratings.delete_many({"article_id": article_id})
+    db.article_stats.delete_many({"_id": {"$in": [article_id, other_id]}})
+
+    for accuracy, bias, insight in [(10, 50, 95), (30, 50, 100)]:
+        response = client.post(f"/api/ratings/{article_id}", json={
+            "user_id": "rating_summary_user", "accuracy": accuracy, "bias": bias, "insight": insight
+        })
+        assert response.status_code == 201
+
+    summary = client.get(f"/api/ratings/{article_id}/summary").get_json()
+    assert summary["count"] == 2
+    assert summary["accuracy"]["mean"] == 20
+    assert summary["bias"]["histogram"][5] == 2
+    assert summary["insight"]["histogram"][9] == 2
+
+    batch = client.get(f"/api/ratings/summary?ids={article_id},{other_id}").get_json()["data"]
+    assert batch[article_id]["count"] == 2
+    assert batch[other_id]["count"] == 0
+
+    db.ratings.delete_many({"article_id": article_id})
+    db.article_stats.delete_many({"_id": article_id})
+
+
+def test_declared_indexes_exist_and_model_queries_avoid_collscan():
+    import indexes
+    indexes.ensure_indexes()
+
+    assert indexes.ensure_indexes() == []
+    assert indexes.missing_indexes() == []
+    assert indexes.non_unique_indexes() == []
+    assert indexes.audit() == []
+
+
+def test_non_unique_index_reported_for_unique_spec(monkeypatch):
+    import indexes
+    from pymongo import IndexModel
+
+    db.index_check_test.drop()
+    db.index_check_test.create_index([("user_id", 1), ("name", 1)], name="hand_made")
+    monkeypatch.setattr(indexes, "INDEXES", {"index_check_test": [
+        IndexModel([("user_id", 1), ("name", 1)], name="user_name", unique=True)]})
+    try:
+        # The keys are covered, so it isn't missing, but the uniqueness is
+        assert indexes.missing_indexes() == []
+        assert indexes.non_unique_indexes() == [("index_check_test", "user_name")]
+    finally:
+        db.index_check_test.drop()
+
+
+def test_get_comments_sorted_and_paginated(client):
+    article_id = "comments_paging_article"
+    db.comments.delete_many({"article_id": article_id})
+    for i in range(5):
+        response = client.post(f"/api/comments/{article_id}", json={"user_id": "pager", "comment": f"Comment {i}"})
+        assert response.status_code == 201
+
+    first = client.get(f"/api/comments/{article_id}?limit=2&total=1").get_json()
+    assert [c["comment"] for c in first["data"]] == ["Comment 4", "Comment 3"]
+    assert first["total"] == 5
+
+    second = client.get(f"/api/comments/{article_id}?limit=2&cursor={first['next_cursor']}").get_json()
+    assert [c["comment"] for c in second["data"]] == ["Comment 2", "Comment 1"]
+
+    oldest = client.get(f"/api/comments/{article_id}?order=oldest&limit=1").get_json()
+    assert oldest["data"][0]["comment"] == "Comment 0"
+
+    mixed = client.get(f"/api/comments/{article_id}?order=oldest&cursor={first['next_cursor']}")
+    assert mixed.status_code == 400
+
+    db.comments.delete_many({"article_id": article_id})
+
+
+def test_google_cert_cache_against_local_cert_server():
+    import threading
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+    import google_certs
+
+    hits = []
+
+    class CertHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            body = json.dumps({"kid-1": "certificate"}).encode()
+            self.send_response(200)
+            self.send_header("Cache-Control", "public, max-age=100")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), CertHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    now = [0.0]
+    cache = google_certs.GoogleCertCache(
+        google_certs.create_http_session(),
+        f"http://127.0.0.1:{server.server_port}/certs",
+        refresh_ahead=10,
+        clock=lambda: now[0],
+    )
+
+    try:
+        assert cache.get() == {"kid-1": "certificate"}
+        assert cache.get() == {"kid-1": "certificate"}
+        assert len(hits) == 1
+
+        # Inside the refresh window the old certs are served while a refresh runs
+        now[0] = 95.0
+        assert cache.get() == {"kid-1": "certificate"}
+        for _ in range(50):
+            if cache.fetches == 2:
+                break
+            time.sleep(0.05)
+        assert len(hits) == 2
+
+        # Fully expired: the next call fetches synchronously
+        now[0] = 500.0
+        cache.get()
+        assert len(hits) == 3
+    finally:
+        server.shutdown()
+
+
+def test_async_models_match_sync_models():
+    import async_models
+    import models
+
+    sync_articles, sync_cursor = models.fetch_all_articles_paginated(page=1, limit=5)
+    async_articles, async_cursor, total = async_models.run(
+        async_models.fetch_all_articles_paginated(page=1, limit=5, with_total=True))
+
+    assert async_articles == sync_articles
+    assert async_cursor == sync_cursor
+    assert total == models.count_feed_articles()
+
+    sync_comments = models.fetch_comments_by_id("123comments_by_id_test", with_total=True)
+    async_comments = async_models.run(async_models.fetch_comments_by_id("123comments_by_id_test", with_total=True))
+    assert async_comments == sync_comments
+
+
+def test_mongo_client_is_recreated_after_fork():
+    import models
+
+    parent_client = models.get_client()
+    assert models.get_client() is parent_client
+
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_end)
+        os.write(write_end, b"1" if models.get_client() is not parent_client else b"0")
+        os._exit(0)
+
+    os.close(write_end)
+    os.waitpid(pid, 0)
+    assert os.read(read_end, 1) == b"1"
+    os.close(read_end)
+
+
+def test_fork_while_client_lock_held_does_not_deadlock():
+    import controllers
+    import models
+
+    # As if the master forked while another thread was connecting
+    models._client_lock.acquire()
+    try:
+        read_end, write_end = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_end)
+            import signal
+            signal.alarm(10)
+            models.get_client()
+            os.write(write_end, b"1")
+            os._exit(0)
+    finally:
+        models._client_lock.release()
+
+    os.close(write_end)
+    os.waitpid(pid, 0)
+    assert os.read(read_end, 1) == b"1"
+    os.close(read_end)
+    # The index check is left to each worker's first request
+    assert controllers.start_background_tasks in controllers.app.before_request_funcs[None]
+
+
+def test_create_app_applies_pool_settings():
+    import controllers
+    import models
+    from config import get_config
+
+    class SmallPoolConfig(get_config()):
+        MONGO_MAX_POOL_SIZE = 7
+
+    try:
+        app = controllers.create_app(SmallPoolConfig)
+        assert "api" in app.blueprints
+        assert models.get_client().options.pool_options.max_pool_size == 7
+    finally:
+        models.configure(controllers.app.config)
+
+
+def test_batch_comments_and_ratings(client):
+    article_id = "batch_write_article"
+    db.comments.delete_many({"article_id": article_id})
+    db.ratings.delete_many({"article_id": article_id})
+    db.article_stats.delete_many({"_id": article_id})
+
+    comments = client.post("/api/comments/batch", json={"comments": [
+        {"article_id": article_id, "user_id": "batcher", "comment": "First"},
+        {"article_id": article_id, "user_id": "batcher"},
+        {"article_id": article_id, "user_id": "batcher", "comment": "Third"},
+    ]})
+    assert comments.status_code == 207
+    body = comments.get_json()
+    assert body["inserted"] == 2
+    assert [result["ok"] for result in body["results"]] == [True, False, True]
+    assert db.comments.count_documents({"article_id": article_id}) == 2
+
+    ratings = client.post("/api/ratings/batch", json={"ratings": [
+        {"article_id": article_id, "user_id": "batcher", "accuracy": 10, "bias": 20, "insight": 30},
+        {"article_id": article_id, "user_id": "batcher", "accuracy": 30, "bias": 40, "insight": 50},
+    ]})
+    assert ratings.status_code == 201
+    assert client.get(f"/api/ratings/{article_id}/summary").get_json()["accuracy"]["mean"] == 20
+
+    invalid = client.post("/api/comments/batch", json={"comments": [{"article_id": article_id}]})
+    assert invalid.status_code == 400
+
+    db.comments.delete_many({"article_id": article_id})
+    db.ratings.delete_many({"article_id": article_id})
+    db.article_stats.delete_many({"_id": article_id})
+
+
+def test_batch_server_failure_is_not_a_client_error(client, monkeypatch):
+    import models
+
+    def failing_insert(collection, documents):
+        raise models.PyMongoError("database unavailable")
+
+    monkeypatch.setattr(models, "insert_batch", failing_insert)
+    response = client.post("/api/comments/batch", json={"comments": [
+        {"article_id": "batch_failure_article", "user_id": "batcher", "comment": "Lost"},
+        {"article_id": "batch_failure_article", "user_id": "batcher"},
+    ]})
+    assert response.status_code == 500
+    results = response.get_json()["results"]
+    assert results[0]["server_error"] and "server_error" not in results[1]
+
+
+def test_metrics_record_routes_and_mongo_commands(client):
+    assert client.get("/api/articles?genre=World").status_code == 200
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    body = response.get_data(as_text=True)
+    assert 'http_requests_total{method="GET",route="/api/articles",status="200"}' in body
+    assert 'http_request_mongo_seconds_count{method="GET",route="/api/articles"}' in body
+    assert 'mongo_command_duration_seconds_count{collection="articles",command="find"}' in body
+
+
+def test_orjson_provider_matches_default_wire_format():
+    from bson import ObjectId
+    from flask.json.provider import DefaultJSONProvider
+
+    app = controllers.app
+    article_id = ObjectId()
+    published = datetime.datetime(2025, 1, 1, 12, 30)
+    article = {"title": "Headline", "published": published, "tags": ["a", "b"], "score": 1.5, "genre": None}
+
+    with app.test_request_context():
+        body = app.json.response({"_id": article_id, **article}).get_data()
+        expected = DefaultJSONProvider(app).response({"_id": str(article_id), **article}).get_data()
+
+    assert body == expected
+    assert json.loads(body)["published"] == "Wed, 01 Jan 2025 12:30:00 GMT"
+
+
+def test_raw_bson_article_reads_match_decoded_reads(client):
+    pytest.importorskip("bsonjs")
+    import models
+
+    genre = "raw_bson_test_genre"
+    db.articles.delete_many({"genre": genre})
+    article_id = str(db.articles.insert_one({
+        "title": "Raw read", "genre": genre, "o_language": "en",
+        "published": datetime.datetime(2025, 3, 4, 5, 6, 7),
+    }).inserted_id)
+
+    try:
+        models.invalidate_article_cache()
+        decoded = client.get(f"/api/articles/{article_id}").get_json()
+        decoded_feed = client.get(f"/api/articles?genre={genre}&fields=card").get_json()
+
+        models.config["RAW_BSON_READS"] = True
+        models.invalidate_article_cache()
+        assert client.get(f"/api/articles/{article_id}").get_json() == decoded
+        assert client.get(f"/api/articles?genre={genre}&fields=card").get_json() == decoded_feed
+        assert client.get(f"/api/articles/{'0' * 24}").status_code == 404
+        assert decoded["published"] == "Tue, 04 Mar 2025 05:06:07 GMT"
+    finally:
+        models.config["RAW_BSON_READS"] = False
+        models.invalidate_article_cache()
+        db.articles.delete_many({"genre": genre})
+
+
+def test_feed_responses_are_compressed_once_and_cached(client):
+    import gzip
+    import models
+
+    genre = "compression_test_genre"
+    db.articles.delete_many({"genre": genre})
+    db.articles.insert_many([
+        {"title": f"Compressible headline {i}", "summary": "The same words again. " * 20, "genre": genre,
+         "o_language": "en"}
+        for i in range(20)
+    ])
+
+    try:
+        models.invalidate_article_cache()
+        plain = client.get(f"/api/articles?genre={genre}")
+        assert plain.headers.get("Content-Encoding") is None
+        assert "Accept-Encoding" in plain.headers["Vary"]
+
+        first = client.get(f"/api/articles?genre={genre}", headers={"Accept-Encoding": "gzip"})
+        second = client.get(f"/api/articles?genre={genre}", headers={"Accept-Encoding": "gzip"})
+        assert first.headers["Content-Encoding"] == "gzip"
+        assert second.get_data() == first.get_data()
+        assert len(first.get_data()) < len(plain.get_data())
+        assert gzip.decompress(first.get_data()) == plain.get_data()
+
+        small = client.get("/api/cache/stats", headers={"Accept-Encoding": "gzip"})
+        assert small.headers.get("Content-Encoding") is None
+    finally:
+        models.invalidate_article_cache()
+        db.articles.delete_many({"genre": genre})
+
+
+def test_article_stats_counters(client):
+    article_id = "article_stats_counter_test"
+    db.comments.delete_many({"article_id": article_id})
+    db.ratings.delete_many({"article_id": article_id})
+    db.article_stats.delete_many({"_id": article_id})
+
+    first = client.post(f"/api/comments/{article_id}", json={"user_id": "counter", "comment": "One"})
+    client.post(f"/api/comments/{article_id}", json={"user_id": "counter", "comment": "Two"})
+    client.post("/api/comments/batch", json={"comments": [
+        {"article_id": article_id, "user_id": "counter", "comment": "Three"}]})
+    client.post(f"/api/ratings/{article_id}", json={"user_id": "counter", "accuracy": 80, "bias": 40, "insight": 60})
+    assert client.delete(f"/api/comments/{first.get_json()['new_comment']['_id']}").status_code == 200
+
+    response = client.get(f"/api/articles/stats?ids={article_id},no_stats_article")
+    assert response.status_code == 200
+    data = response.get_json()["data"]
+    assert data[article_id]["comments"] == 2
+    assert data[article_id]["ratings"] == 1
+    assert data[article_id]["means"]["accuracy"] == 80
+    assert data["no_stats_article"] == {"article_id": "no_stats_article", "comments": 0, "ratings": 0,
+                                        "means": {"accuracy": None, "bias": None, "insight": None}}
+    assert client.get("/api/articles/stats").status_code == 400
+
+    db.comments.delete_many({"article_id": article_id})
+    db.ratings.delete_many({"article_id": article_id})
+    db.article_stats.delete_many({"_id": article_id})
+
+
+def test_articles_batch_in_request_order(client):
+    genre = "articles_batch_genre"
+    db.articles.delete_many({"genre": genre})
+    first, second = [str(article_id) for article_id in db.articles.insert_many([
+        {"title": "First", "summary": "One", "genre": genre, "o_language": "en"},
+        {"title": "Second", "summary": "Two", "genre": genre, "o_language": "en"},
+    ]).inserted_ids]
+    gone = "0123456789abcdef01234567"
+
+    response = client.get(f"/api/articles/batch?ids={second},bad-id,{gone},{first}&fields=title")
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["data"] == [{"_id": second, "title": "Second"}, {"_id": first, "title": "First"}]
+    assert body["invalid"] == ["bad-id"]
+    assert body["missing"] == [gone]
+
+    posted = client.post("/api/articles/batch", json={"ids": [first, second]}).get_json()
+    assert [article["summary"] for article in posted["data"]] == ["One", "Two"]
+    assert client.post("/api/articles/batch", json={"ids": "nope"}).status_code == 400
+    list_fields = client.post("/api/articles/batch", json={"ids": [first], "fields": ["title"]})
+    assert list_fields.status_code == 400
+
+    db.articles.delete_many({"genre": genre})
+
+
+def test_invalidate_cached_article_drops_only_affected_entries():
+    import models
+
+    models.invalidate_article_cache()
+    keys = {
+        "world_feed": models.article_cache_key("feed", "World", None),
+        "sport_feed": models.article_cache_key("feed", "Sport", None),
+        "all_feed": models.article_cache_key("feed", None, None),
+        "world_page": models.article_cache_key("paginated", "World", None, 2, None, 20),
+        "article": models.article_cache_key("article", "a1"),
+        "other_article": models.article_cache_key("article", "a2"),
+    }
+    for key in keys.values():
+        models.article_cache.set(key, b"cached")
+
+    assert models.invalidate_cached_article("a1", "World", "BBC-News") == 4
+    assert models.article_cache.get(keys["sport_feed"]) is not None
+    assert models.article_cache.get(keys["other_article"]) is not None
+    assert models.article_cache.get(keys["world_page"]) is None
+
+    # Unknown genre (e.g. a delete) reaches every feed
+    assert models.invalidate_cached_article("a3") == 1
+    models.invalidate_article_cache()
+
+
+def test_live_broadcaster_replays_after_last_event_id():
+    import live
+
+    broadcaster = live.Broadcaster(history_size=10, queue_size=2)
+    for i in range(3):
+        broadcaster.publish(live.LiveEvent(f"token{i}", "article", "World", b"{}"))
+
+    subscriber, backlog = broadcaster.subscribe(last_event_id="token0")
+    assert [event.id for event in backlog] == ["token1", "token2"]
+
+    for i in range(3, 6):
+        broadcaster.publish(live.LiveEvent(f"token{i}", "article", "Sport", b"{}"))
+    # A subscriber that falls behind is dropped rather than blocking the watcher
+    assert subscriber.dropped and len(broadcaster) == 0
+    assert not backlog[0].matches("Sport", {"article"})
+    assert backlog[0].matches(None, {"article"})
+
+
+def test_change_watcher_invalidates_and_publishes(client):
+    import live
+    import models
+
+    if "setName" not in db.client.admin.command("hello"):
+        pytest.skip("change streams need a replica set (mongod --replSet rs0)")
+
+    genre = "live_watcher_genre"
+    broadcaster = live.Broadcaster()
+    watcher = live.ChangeWatcher(broadcaster, name="live_watcher_test", token_interval=0)
+    db.change_stream_tokens.delete_many({"_id": "live_watcher_test"})
+    subscriber, _ = broadcaster.subscribe()
+    watcher.start()
+
+    try:
+        key = models.article_cache_key("feed", genre, None)
+        models.article_cache.set(key, b"stale")
+        time.sleep(1.5)
+        db.articles.insert_one({"title": "Breaking", "genre": genre, "o_language": "en"})
+
+        event = subscriber.queue.get(timeout=10)
+        assert event.type == "article" and event.genre == genre
+        assert json.loads(event.data)["article"]["title"] == "Breaking"
+        assert models.article_cache.get(key) is None
+        assert db.change_stream_tokens.find_one({"_id": "live_watcher_test"}) is not None
+    finally:
+        watcher.stop()
+        db.articles.delete_many({"genre": genre})
+        db.change_stream_tokens.delete_many({"_id": "live_watcher_test"})
+
+
+def test_article_facets_materialized_and_used_for_totals(client):
+    import models
+
+    genre = "facets_test_genre"
+    db.articles.delete_many({"genre": genre})
+    db.articles.insert_many([
+        {"title": "Facet one", "genre": genre, "author": "Facet-Source", "o_language": "en"},
+        {"title": "Facet two", "genre": genre, "author": "Facet-Source", "o_language": "fr", "translated": True},
+        {"title": "Not in the feed", "genre": genre, "author": "Facet-Source", "o_language": "fr"},
+    ])
+
+    try:
+        models.refresh_article_facets()
+        body = client.get("/api/articles/facets").get_json()
+        assert {"value": genre, "count": 2} in body["genres"]
+        assert body["total"] == sum(row["count"] for row in body["genres"])
+
+        # While the summary is fresh the paginated total is read from it, not counted
+        db.articles.insert_one({"title": "After refresh", "genre": genre, "o_language": "en"})
+        models.invalidate_article_cache()
+        page = client.get(f"/api/articles/paginated?genre={genre}&limit=10").get_json()
+        assert page["total"] == 2
+        assert models.count_feed_articles(genre, "Facet-Source") == 2
+
+        db.article_facets.update_one({"_id": models.ARTICLE_FACETS_ID},
+                                     {"$set": {"computed_at": datetime.datetime(2000, 1, 1)}})
+        # A stale summary is still served while one background refresh recomputes it
+        assert models.count_feed_articles(genre) == 2
+        deadline = time.monotonic() + 10
+        while models.count_feed_articles(genre) != 3 and time.monotonic() < deadline:
+            time.sleep(0.1)
+        assert models.count_feed_articles(genre) == 3
+        refreshed = client.get("/api/articles/facets").get_json()
+        assert {"value": genre, "count": 3} in refreshed["genres"]
+    finally:
+        db.articles.delete_many({"genre": genre})
+        models.refresh_article_facets()
+        models.invalidate_article_cache()
+
+
+def test_feed_reads_routed_to_secondaries():
+    import controllers
+    import models
+    from config import get_config, read_route
+    from pymongo import MongoClient, monitoring
+
+    class CommandRecorder(monitoring.CommandListener):
+        def __init__(self):
+            self.finds = []
+
+        def started(self, event):
+            if event.command_name == "find" and event.command.get("find") == "articles":
+                self.finds.append(event.connection_id)
+
+        def succeeded(self, event):
+            pass
+
+        def failed(self, event):
+            pass
+
+    class SecondaryReadsConfig(get_config()):
+        READ_ROUTES = dict(get_config().READ_ROUTES,
+                           feed=read_route("feed", "secondaryPreferred", max_staleness=120))
+
+    recorder = CommandRecorder()
+    # A client of the test's own, so the listener doesn't reach any other client
+    client = MongoClient(SecondaryReadsConfig.MONGO_URI, event_listeners=[recorder])
+    try:
+        controllers.create_app(SecondaryReadsConfig)
+        articles = models.read_collection("articles", "feed")
+        assert articles.read_preference.mongos_mode == "secondaryPreferred"
+        assert articles.read_preference.max_staleness == 120
+        assert models.read_collection("articles", "feed") is articles
+        # Reads of a user's own data keep the primary
+        assert models.db.collection_meta.read_preference.mongos_mode == "primary"
+
+        # Three-member replica set: mongod --replSet rs0 on three ports, rs.initiate() with all three
+        if "setName" not in client.admin.command("hello"):
+            pytest.skip("read routing needs a replica set with secondaries")
+        deadline = time.monotonic() + 10
+        while not client.secondaries and time.monotonic() < deadline:
+            time.sleep(0.2)
+        if not client.secondaries:
+            pytest.skip("no secondary is reachable")
+
+        routed = client[models.database_name()]["articles"].with_options(**models.read_options("feed"))
+        routed.find_one({})
+        assert recorder.finds and recorder.finds[-1] in client.secondaries
+    finally:
+        client.close()
+        models.configure(controllers.app.config)